@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""Log-space binomial probabilities that stay usable for very large n.
+
+The symmetric-coin example of the lesson computes
+`sps.comb(trials, i, exact=True)/possibilities` with `possibilities = 2**trials`.
+That builds Python integers with `trials` bits, so it stops being usable past
+a few thousand trials. Here the PMF is evaluated in log space, vectorized
+over all `k`:
+
+    log P(X=k) = lnGamma(n+1) - lnGamma(k+1) - lnGamma(n-k+1) + k ln p + (n-k) ln(1-p)
+
+Written like that the `gammaln` terms are ~n ln(n) and cancel each other,
+losing about 7 digits at n = 10**8, so the terms are regrouped as in
+Loader's algorithm (Stirling remainders plus a deviance term), which keeps
+full precision for any n.
+
+`LogBinomial` also keeps the cumulative sums over the window where the PMF
+is not negligible next to the smallest normal float64, found by bisection
+on either side of the mode, so a skewed p keeps its long tail. That keeps
+`cdf` and `sf` stable for n up to 10**8. Outside the window the
+probabilities are below what a float64 can hold and are returned as
+exactly 0 or 1.
+"""
+
+from fractions import Fraction
+
+import numpy as np
+from scipy import special as sps
+
+# The CDF window ends where the PMF drops below the smallest normal float
+# times eps, so tail sums that are still normal floats keep full precision
+LOG_TINY = np.log(np.finfo(np.float64).tiny * np.finfo(np.float64).eps)
+
+_LN_SQRT_2PI = 0.5 * np.log(2 * np.pi)
+
+
+def _stirlerr(n):
+    # lnGamma(n+1) - (n+0.5) ln(n) + n - ln(sqrt(2 pi)), without cancellation
+    n = np.asarray(n, dtype=np.float64)
+    small = n <= 15
+    ns = np.where(small, np.maximum(n, 1), 16)
+    direct = sps.gammaln(ns + 1) - (ns + 0.5) * np.log(ns) + ns - _LN_SQRT_2PI
+    nl = np.where(small, 16, n)
+    nn = nl * nl
+    s0, s1, s2, s3, s4 = 1 / 12, 1 / 360, 1 / 1260, 1 / 1680, 1 / 1188
+    series = np.where(
+        nl > 500, (s0 - s1 / nn) / nl, np.where(
+            nl > 80, (s0 - (s1 - s2 / nn) / nn) / nl, np.where(
+                nl > 35, (s0 - (s1 - (s2 - s3 / nn) / nn) / nn) / nl,
+                (s0 - (s1 - (s2 - (s3 - s4 / nn) / nn) / nn) / nn) / nl)))
+    return np.where(small, direct, series)
+
+
+def _bd0(x, m):
+    # x ln(x/m) + m - x, the "deviance" term, stable when x is close to m
+    x = np.asarray(x, dtype=np.float64)
+    m = np.asarray(m, dtype=np.float64)
+    close = np.abs(x - m) < 0.1 * (x + m)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        direct = sps.xlogy(x, x / m) + m - x
+        v = np.where(close, (x - m) / (x + m), 0)
+    total = (x - m) * v
+    ej = 2 * x * v
+    v2 = v * v
+    for j in range(1, 1000):
+        ej = ej * v2
+        term = ej / (2 * j + 1)
+        if not np.any(term != 0):
+            break
+        total = total + term
+    return np.where(close, total, direct)
+
+
+def logpmf(k, n, p):
+    """Natural log of the binomial PMF, vectorized over `k` (and `n`, `p`).
+
+    Uses Loader's saddle-point form, so there is no cancellation between
+    the huge `lnGamma` terms when `n` is large.
+    """
+    k = np.asarray(k, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    p = np.asarray(p, dtype=np.float64)
+    q = 1 - p
+    inside = (k >= 0) & (k <= n) & (k == np.floor(k))
+    middle = inside & (k > 0) & (k < n)
+    km = np.where(middle, k, 1)
+    nm = np.where(middle, n, 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_c = (_stirlerr(nm) - _stirlerr(km) - _stirlerr(nm - km)
+                 - _bd0(km, nm * p) - _bd0(nm - km, nm * q))
+        log_f = 2 * _LN_SQRT_2PI + np.log(km) + np.log1p(-km / nm)
+        result = log_c - 0.5 * log_f
+        # k = 0 and k = n are just q**n and p**n (0*log(0) counts as 0)
+        result = np.where(k == 0, sps.xlog1py(n, -p), result)
+        result = np.where((k == n) & (k > 0), sps.xlogy(n, p), result)
+    return np.where(inside, result, -np.inf)
+
+
+def pmf(k, n, p):
+    return np.exp(logpmf(k, n, p))
+
+
+def _window_edge(n, p, inner, outer):
+    # The k between `inner` (the mode) and `outer` closest to the mode
+    # with logpmf(k) < LOG_TINY, or `outer`; the PMF only falls away from
+    # the mode, so bisection finds it
+    if logpmf(outer, n, p) >= LOG_TINY:
+        return outer
+    while abs(outer - inner) > 1:
+        middle = (inner + outer) // 2
+        if logpmf(middle, n, p) < LOG_TINY:
+            outer = middle
+        else:
+            inner = middle
+    return outer
+
+
+class LogBinomial:
+    """Binomial(n, p) with log-space PMF, CDF and survival function."""
+
+    def __init__(self, n, p):
+        n = int(n)
+        if n < 0 or not 0 <= p <= 1:
+            raise ValueError('binomial needs n >= 0 and 0 <= p <= 1')
+        self.n = n
+        self.p = p
+        mode = min(n, int(np.floor((n + 1) * p)))
+        self.lo = _window_edge(n, p, mode, 0)
+        self.hi = _window_edge(n, p, mode, n)
+        log_window = logpmf(np.arange(self.lo, self.hi + 1), n, p)
+        # Running log-sum-exp from the left (CDF) and from the right (SF)
+        self._log_cdf = np.logaddexp.accumulate(log_window)
+        self._log_sf = np.logaddexp.accumulate(log_window[::-1])[::-1]
+
+    def mean(self):
+        return self.n * self.p
+
+    def var(self):
+        return self.n * self.p * (1 - self.p)
+
+    def std(self):
+        return self.var() ** 0.5
+
+    def logpmf(self, k):
+        return logpmf(k, self.n, self.p)
+
+    def pmf(self, k):
+        return np.exp(self.logpmf(k))
+
+    def pmf_all(self):
+        """PMF over the whole support `0..n`, like the lesson's `p` array."""
+        return self.pmf(np.arange(self.n + 1))
+
+    def logcdf(self, k):
+        """log P(X <= k)."""
+        k = np.floor(np.asarray(k, dtype=np.float64))
+        index = np.clip(k - self.lo, 0, self._log_cdf.size - 1).astype(np.int64)
+        result = self._log_cdf[index]
+        result = np.where(k < self.lo, -np.inf, result)
+        return np.where(k >= self.hi, 0.0, result)
+
+    def logsf(self, k):
+        """log P(X > k)."""
+        k = np.floor(np.asarray(k, dtype=np.float64))
+        index = np.clip(k + 1 - self.lo, 0, self._log_sf.size - 1).astype(np.int64)
+        result = self._log_sf[index]
+        result = np.where(k < self.lo, 0.0, result)
+        return np.where(k >= self.hi, -np.inf, result)
+
+    def cdf(self, k):
+        return np.exp(self.logcdf(k))
+
+    def sf(self, k):
+        return np.exp(self.logsf(k))
+
+
+def exact_pmf(k, n, p=0.5):
+    """Exact-integer PMF, the way the lesson computes it (only for small n).
+
+    `p` is turned into an exact fraction, so `exact_pmf(i, trials)` equals
+    `sps.comb(trials, i, exact=True)/2**trials`.
+    """
+    p = Fraction(str(p))
+    value = sps.comb(n, k, exact=True) * p ** k * (1 - p) ** (n - k)
+    return float(value)
+
+
+def _skewed_tail_error(n, p, count=400):
+    # Worst relative error of cdf/sf at k < count for Binomial(n, p) and,
+    # mirrored, for Binomial(n, 1 - p), against exact fractions; for small
+    # p these are the long, far-from-normal tails
+    f = Fraction(str(p))
+    term, cdf = (1 - f) ** n, Fraction(0)
+    exact_cdf, exact_sf = [], []
+    for k in range(count):
+        cdf += term
+        exact_cdf.append(float(cdf))
+        exact_sf.append(float(1 - cdf))
+        term = term * (n - k) * f / ((k + 1) * (1 - f))
+    k = np.arange(count)
+    exact = np.array(exact_cdf + exact_sf + exact_sf + exact_cdf)
+    dist, mirrored = LogBinomial(n, p), LogBinomial(n, 1 - p)
+    approx = np.concatenate([dist.cdf(k), dist.sf(k),
+                             mirrored.cdf(n - 1 - k), mirrored.sf(n - 1 - k)])
+    used = exact >= np.finfo(np.float64).tiny
+    return (np.abs(approx[used] - exact[used]) / exact[used]).max()
+
+
+def check_against_exact(max_n=200, probabilities=(0.5, 0.25, 0.1875, 0.9), tol=1e-10,
+                        skewed=((5000, 1e-3), (2000, 1e-4))):
+    """Worst PMF relative error / CDF absolute error against `exact_pmf`.
+
+    `skewed` lists `(n, p)` with small p whose tails, and those of the
+    mirrored `1 - p`, are checked in relative error down to the smallest
+    normal float. Raises AssertionError when the worst error is above
+    `tol`, so a regression fails rather than only printing a larger number.
+    """
+    worst = 0.0
+    for n in range(0, max_n + 1):
+        for p in probabilities:
+            dist = LogBinomial(n, p)
+            exact = np.array([exact_pmf(k, n, p) for k in range(n + 1)])
+            approx = dist.pmf_all()
+            used = exact > 0
+            error = np.abs(approx[used] - exact[used]) / exact[used]
+            worst = max(worst, error.max())
+            exact_cdf = np.cumsum(exact)
+            cdf_error = np.abs(dist.cdf(np.arange(n + 1)) - exact_cdf)
+            worst = max(worst, cdf_error.max())
+    for n, p in skewed:
+        worst = max(worst, _skewed_tail_error(n, p))
+    if not worst <= tol:
+        raise AssertionError('error %.3e against the exact path is above %.0e' % (worst, tol))
+    return worst
+
+
+if __name__ == '__main__':
+    import time
+
+    # Same values as the lesson's symmetric-coin example
+    trials = 3
+    print(np.arange(trials + 1))
+    print(LogBinomial(trials, 0.5).pmf_all())
+
+    print('max error vs exact path (n <= 200, skewed tails) : %.3e' % check_against_exact())
+
+    for n in (10**4, 10**6, 10**8):
+        start = time.perf_counter()
+        dist = LogBinomial(n, 0.5)
+        x = np.array([n // 2 - dist.std() * 3, n // 2, n // 2 + dist.std() * 3])
+        print('n = %9d   cdf : %s   (%.3fs)'
+              % (n, dist.cdf(x), time.perf_counter() - start))
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Binomial CDF / tail queries that pick the cheapest method within an error bound.
+
+The lesson shows that with n = 100 the binomial already looks normal. How
+close it is can be bounded, so for every query `evaluate` uses the
+cheapest of three methods whose worst-case absolute error is at most `tol`:
+
+* `'normal'`  : normal approximation with continuity correction. Error
+  bound from Berry-Esseen, 0.4748 (p**2 + q**2) / sqrt(n p q). It covers
+  the corrected value too, since that lies between the uncorrected values
+  at k and k + 1, both within the bound of the same CDF value.
+* `'poisson'` : Poisson(np) approximation. Error bound from Barbour-Hall,
+  total variation distance <= (1 - exp(-np)) p.
+* `'exact'`   : log-space sum of the PMF (`binomial.logpmf`) from `k`
+  outwards, away from the mode, stopping once a geometric bound on the
+  rest of the tail is negligible. The reported bound is that truncation
+  bound plus float rounding, about 8 eps per summed term. That rounding
+  is a floor: when a tail needs ~1e6 terms no `tol` below ~1e-9 can be
+  met, and `evaluate` then warns and reports the bound it did reach.
+
+The two approximations are O(1), so tail queries for n ~ 10**9 take
+microseconds whenever `tol` allows one of them. Bounds are absolute: a
+tail probability far below `tol` can have a large relative error.
+
+    >>> evaluate(5 * 10**8 + 10**5, 10**9, 0.5, tol=1e-4, upper=True)
+    Evaluation(value=1.27e-10, method='normal', bound=1.5e-05)
+"""
+
+import warnings
+
+import numpy as np
+from scipy import special as sps
+
+from binomial import logpmf
+
+METHODS = ('normal', 'poisson', 'exact')
+
+# Berry-Esseen constant for sums of identically distributed terms (Shevtsova, 2011)
+BERRY_ESSEEN = 0.4748
+
+# Smallest block of PMF terms summed at once by the exact method
+EXACT_BLOCK = 256
+
+
+class Evaluation:
+    """Result of `evaluate`: the value, the method used and its error bound."""
+
+    def __init__(self, value, method, bound):
+        self.value = value
+        self.method = method
+        self.bound = bound
+
+    def __float__(self):
+        return float(self.value)
+
+    def __repr__(self):
+        if np.ndim(self.value):
+            value = np.array2string(np.asarray(self.value), precision=4)
+        else:
+            value = '%.4g' % self.value
+        return 'Evaluation(value=%s, method=%r, bound=%.2g)' % (value, self.method, self.bound)
+
+
+def normal_bound(n, p):
+    """Berry-Esseen bound on |P(X <= k) - normal approximation|."""
+    q = 1 - p
+    with np.errstate(divide='ignore'):
+        return np.minimum(BERRY_ESSEEN * (p * p + q * q) / np.sqrt(n * p * q), 1.0)
+
+
+def poisson_bound(n, p):
+    """Barbour-Hall bound on |P(X <= k) - Poisson(np) CDF|."""
+    return -np.expm1(-n * p) * p
+
+
+def normal_cdf(k, n, p, upper=False):
+    z = (np.floor(k) + 0.5 - n * p) / np.sqrt(n * p * (1 - p))
+    return sps.ndtr(-z if upper else z)
+
+
+def poisson_cdf(k, n, p, upper=False):
+    return (sps.pdtrc if upper else sps.pdtr)(np.floor(k), n * p)
+
+
+def _tail_sum(start, step, n, p, tol):
+    # Sum the PMF from `start` in direction `step` (+1 or -1), moving away
+    # from the mode, until a geometric bound on the rest is below `tol`
+    q = 1 - p
+    total, terms, block, j = 0.0, 0, EXACT_BLOCK, start
+    while 0 <= j <= n:
+        stop = min(j + step * block, n + 1) if step > 0 else max(j + step * block, -1)
+        values = np.exp(logpmf(np.arange(j, stop, step), n, p))
+        total += values.sum()
+        terms += values.size
+        j = stop
+        if not 0 <= j <= n:
+            return total, 0.0, terms
+        # Ratio of the next term to the last one; it only shrinks further out
+        if step > 0:
+            ratio = (n - j + 1) * p / (j * q) if q > 0 else 1.0
+        else:
+            ratio = (j + 1) * q / ((n - j) * p) if p > 0 else 1.0
+        if ratio < 1:
+            rest = values[-1] * ratio / (1 - ratio)
+            if rest <= tol:
+                return total, rest, terms
+        block *= 2
+    return total, 0.0, terms
+
+
+def exact_cdf(k, n, p, tol=1e-12, upper=False):
+    """P(X <= k), or P(X > k) when `upper`, by summing the smaller tail.
+
+    Returns `(value, bound)`. When the query is the tail that was summed,
+    the sum is returned as is, so it keeps its relative precision.
+    """
+    k = int(np.floor(k))
+    if k < 0 or k >= n:
+        value = 0.0 if k < 0 else 1.0
+        return (1 - value if upper else value), 0.0
+    mode = int(np.floor((n + 1) * p))
+    if k < mode:
+        total, rest, terms = _tail_sum(k, -1, n, p, tol)
+        value = 1 - total if upper else total
+    else:
+        total, rest, terms = _tail_sum(k + 1, 1, n, p, tol)
+        value = total if upper else 1 - total
+    rounding = 8 * np.finfo(float).eps * (terms + 1)
+    return min(max(value, 0.0), 1.0), rest + rounding
+
+
+def choose_method(n, p, tol):
+    """Cheapest method whose error bound is at most `tol`, and that bound."""
+    if not 0 < p < 1:
+        return 'exact', 0.0
+    bound = normal_bound(n, p)
+    if bound <= tol:
+        return 'normal', float(bound)
+    bound = poisson_bound(n, p)
+    if bound <= tol:
+        return 'poisson', float(bound)
+    return 'exact', None
+
+
+def evaluate(k, n, p, tol=1e-6, upper=False):
+    """P(X <= k) (or P(X > k) when `upper`) for X ~ Binomial(n, p), within `tol`.
+
+    `k` may be an array; the method depends only on `(n, p, tol)`, so all
+    `k` of one call share it. Returns an `Evaluation`.
+    """
+    n = int(n)
+    if n < 0 or not 0 <= p <= 1:
+        raise ValueError('binomial needs n >= 0 and 0 <= p <= 1')
+    if tol <= 0:
+        raise ValueError('tol must be positive')
+    method, bound = choose_method(n, p, tol)
+    k = np.asarray(k, dtype=np.float64)
+    # Upper tails are computed directly rather than as 1 - P(X <= k), so
+    # small ones keep their precision
+    if method == 'normal':
+        value = normal_cdf(k, n, p, upper)
+    elif method == 'poisson':
+        value = poisson_cdf(k, n, p, upper)
+    else:
+        # Leave most of the budget to rounding, a small share to truncation
+        pairs = [exact_cdf(x, n, p, tol * 1e-3, upper) for x in k.ravel()]
+        value = np.array([v for v, _ in pairs]).reshape(k.shape)
+        bound = max([b for _, b in pairs], default=0.0)
+        if bound > tol:
+            warnings.warn('no method reaches tol=%.2g for n=%d, p=%g; the exact sum '
+                          'is only good to %.2g' % (tol, n, p, bound), RuntimeWarning)
+    below, above = (1.0, 0.0) if upper else (0.0, 1.0)
+    value = np.where(k < 0, below, np.where(k >= n, above, value))
+    return Evaluation(value[()], method, bound)
+
+
+def cdf(k, n, p, tol=1e-6):
+    return evaluate(k, n, p, tol).value
+
+
+def sf(k, n, p, tol=1e-6):
+    return evaluate(k, n, p, tol, upper=True).value
+
+
+if __name__ == '__main__':
+    import time
+
+    from scipy import stats
+
+    # The lesson's n = 100, p = 0.25 example
+    print('P(X <= 30), n=100 p=0.25 : ', evaluate(30, 100, 0.25, tol=0.1),
+          '  scipy %.6f' % stats.binom.cdf(30, 100, 0.25))
+    print('                          ', evaluate(30, 100, 0.25, tol=1e-9))
+    print('rare events, n=1e6 p=1e-6 :', evaluate(3, 10**6, 1e-6, tol=1e-5),
+          '  scipy %.6f' % stats.binom.cdf(3, 10**6, 1e-6))
+
+    n, p = 10**9, 0.5
+    k = n // 2 + 50000
+    for tol in (1e-4, 1e-8):
+        start = time.perf_counter()
+        result = evaluate(k, n, p, tol, upper=True)
+        elapsed = time.perf_counter() - start
+        print('n=1e9 tail, tol=%g : %s  (%.1f us)   scipy %.4g'
+              % (tol, result, elapsed * 1e6, stats.binom.sf(k, n, p)))
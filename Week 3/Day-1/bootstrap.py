@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Vectorized bootstrap confidence intervals for means and proportions.
+
+Section J.4 of the lesson estimates a margin of error as `m +/- 2*sd` from
+10000 simulated proportions, and summarizes the 16-passenger `searches`
+array with `np.mean`/`np.std`. Here the B bootstrap resamples are generated
+as matrices, a chunk of rows at a time so memory stays bounded:
+
+* proportions: resampling n 0/1 values is a Binomial(n, p-hat) draw, so
+  each resample costs one number instead of n,
+* means of data with few distinct values: one multinomial-weight matrix
+  of shape (B, distinct values),
+* other means: one (B, n) index matrix.
+
+`BootstrapResult` then gives percentile, BCa and normal (`m +/- z*sd`)
+intervals from the replicates.
+
+    >>> searches = np.array([0,1,0,0,1,0,0,0,0,0,0,0,1,0,0,0])
+    >>> bootstrap_proportion(searches, B=10**6).interval(0.95, 'bca')
+"""
+
+import numpy as np
+from scipy.stats import norm
+
+from montecarlo import get_rng
+
+# Largest number of matrix cells generated at once
+DEFAULT_MAX_CELLS = 1 << 24
+
+# Use multinomial weights when there are at most this many distinct values
+MAX_DISTINCT = 1024
+
+
+def _row_chunks(rows, width, max_cells):
+    step = max(1, max_cells // max(1, width))
+    for begin in range(0, rows, step):
+        yield begin, min(begin + step, rows)
+
+
+class BootstrapResult:
+    """Bootstrap replicates of a statistic, with confidence intervals."""
+
+    def __init__(self, estimate, replicates, jackknife):
+        self.estimate = estimate
+        self.replicates = replicates
+        self.jackknife = jackknife
+
+    @property
+    def B(self):
+        return self.replicates.size
+
+    def std_error(self):
+        return float(self.replicates.std(ddof=1))
+
+    def percentile_interval(self, level=0.95):
+        alpha = (1 - level) / 2
+        low, high = np.quantile(self.replicates, [alpha, 1 - alpha])
+        return float(low), float(high)
+
+    def normal_interval(self, level=0.95):
+        """`m +/- z*sd`, the lesson's margin of error (z ~ 2 at 95%)."""
+        z = norm.ppf(0.5 + level / 2)
+        sd = self.std_error()
+        return float(self.estimate - z * sd), float(self.estimate + z * sd)
+
+    def bca_interval(self, level=0.95):
+        """Bias-corrected and accelerated interval (Efron, 1987)."""
+        below = np.count_nonzero(self.replicates < self.estimate)
+        ties = np.count_nonzero(self.replicates == self.estimate)
+        share = (below + 0.5 * ties) / self.B
+        share = np.clip(share, 1 / (self.B + 1), self.B / (self.B + 1))
+        z0 = norm.ppf(share)
+
+        # Acceleration from the jackknife values
+        d = self.jackknife.mean() - self.jackknife
+        denominator = 6 * (d ** 2).sum() ** 1.5
+        a = (d ** 3).sum() / denominator if denominator > 0 else 0.0
+
+        alpha = (1 - level) / 2
+        z = norm.ppf([alpha, 1 - alpha])
+        adjusted = norm.cdf(z0 + (z0 + z) / (1 - a * (z0 + z)))
+        low, high = np.quantile(self.replicates, adjusted)
+        return float(low), float(high)
+
+    def interval(self, level=0.95, method='percentile'):
+        methods = {'percentile': self.percentile_interval,
+                   'bca': self.bca_interval,
+                   'normal': self.normal_interval}
+        if method not in methods:
+            raise ValueError('method must be one of %s' % sorted(methods))
+        return methods[method](level)
+
+
+def _mean_jackknife(values, counts, n):
+    # Leave-one-out means, one per distinct value, repeated `counts` times
+    total = (values * counts).sum()
+    return np.repeat((total - values) / (n - 1), counts)
+
+
+def bootstrap_mean(data, B=10000, rng=None, max_cells=DEFAULT_MAX_CELLS):
+    """Bootstrap the mean of `data` with `B` resamples."""
+    data = np.asarray(data, dtype=np.float64).ravel()
+    n = data.size
+    if n < 2:
+        raise ValueError('need at least two observations')
+    rng = get_rng(rng)
+    values, counts = np.unique(data, return_counts=True)
+    replicates = np.empty(B)
+
+    if values.size <= MAX_DISTINCT:
+        # Multinomial weights over the distinct values
+        freq = counts / n
+        for begin, end in _row_chunks(B, values.size, max_cells):
+            weights = rng.multinomial(n, freq, size=end - begin)
+            np.divide(weights @ values, n, out=replicates[begin:end])
+    else:
+        for begin, end in _row_chunks(B, n, max_cells):
+            index = rng.integers(0, n, size=(end - begin, n))
+            np.mean(data[index], axis=1, out=replicates[begin:end])
+
+    return BootstrapResult(float(data.mean()), replicates,
+                           _mean_jackknife(values, counts, n))
+
+
+def bootstrap_proportion(data=None, B=10000, rng=None, successes=None, n=None):
+    """Bootstrap a sample proportion, from 0/1 `data` or `successes` out of `n`."""
+    if data is not None:
+        data = np.asarray(data)
+        n = data.size
+        successes = int(np.count_nonzero(data))
+    if n is None or successes is None or n < 2 or not 0 <= successes <= n:
+        raise ValueError('need 0/1 data, or successes out of n >= 2')
+    rng = get_rng(rng)
+    p_hat = successes / n
+    replicates = rng.binomial(n, p_hat, size=B) / n
+    values = np.array([0.0, 1.0])
+    counts = np.array([n - successes, successes])
+    return BootstrapResult(p_hat, replicates, _mean_jackknife(values, counts, n))
+
+
+if __name__ == '__main__':
+    import time
+
+    searches = np.array([0, 1, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0])
+    result = bootstrap_proportion(searches, B=10**6, rng=0)
+    print('Mean : ', result.estimate)
+    for method in ('normal', 'percentile', 'bca'):
+        print('%-10s : %s' % (method, result.interval(0.95, method)))
+
+    rng = np.random.default_rng(1)
+    for name, data in (('grades (integers)', rng.integers(0, 101, 10**5)),
+                       ('continuous', rng.exponential(size=10**4))):
+        B = 10**6 if name.startswith('grades') else 10**4
+        start = time.perf_counter()
+        result = bootstrap_mean(data, B=B, rng=2)
+        print('%s : B = %d  n = %d  bca = %s  (%.2fs)'
+              % (name, B, data.size, result.bca_interval(), time.perf_counter() - start))
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""O(1)-per-draw sampling from categorical distributions (alias method).
+
+The lesson's weather example is a categorical distribution: sunny on 60% of
+days, cloudy on 30% and rainy on 10%. `AliasSampler` builds Walker/Vose
+alias tables once from the probability vector; every draw then costs one
+uniform number, one table lookup and one comparison, whatever the number
+of categories (`np.random.choice(p=...)` does a binary search per draw).
+
+    >>> weather = weather_sampler()
+    >>> weather.sample_labels(7)
+    >>> AliasSampler(p).sample(10**9, out=np.empty(10**9, dtype=np.int64))
+"""
+
+import numpy as np
+
+from montecarlo import get_rng
+
+WEATHER = {'sunny': 0.6, 'cloudy': 0.3, 'rainy': 0.1}
+
+# Draws generated per chunk, so temporary buffers stay small
+DEFAULT_CHUNK = 1 << 20
+
+
+def build_alias_table(probs):
+    """Return `(threshold, alias)` arrays for the probability vector `probs`.
+
+    Vose's method, vectorized: in every round all the "small" columns
+    (scaled probability < 1) are topped up at once, each from the "large"
+    column whose cumulative surplus covers the start of its deficit. A
+    large column pushed below 1 becomes small for the next round.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    if probs.ndim != 1 or probs.size == 0:
+        raise ValueError('probs must be a non-empty 1-D array')
+    if (probs < 0).any() or not probs.sum() > 0:
+        raise ValueError('probabilities must be non-negative and not all zero')
+    n = probs.size
+    q = probs * (n / probs.sum())
+    threshold = np.ones(n)
+    alias = np.arange(n)
+
+    small = np.flatnonzero(q < 1)
+    large = np.flatnonzero(q >= 1)
+    while small.size and large.size:
+        deficit = 1 - q[small]
+        start = np.cumsum(deficit) - deficit
+        surplus_end = np.cumsum(q[large] - 1)
+        donor = np.searchsorted(surplus_end, start, side='right')
+        served = donor < large.size
+        if not served.any():
+            # Only rounding error is left
+            break
+        filled = small[served]
+        threshold[filled] = q[filled]
+        alias[filled] = large[donor[served]]
+        q[large] -= np.bincount(donor[served], weights=deficit[served],
+                                minlength=large.size)
+        moved = q[large] < 1
+        small = np.concatenate([small[~served], large[moved]])
+        large = large[~moved]
+    # Whatever is left over is 1 up to rounding error
+    return threshold, alias
+
+
+class AliasSampler:
+    """Categorical sampler with O(1) draws, built once from `probs`."""
+
+    def __init__(self, probs, labels=None, rng=None):
+        self.threshold, self.alias = build_alias_table(probs)
+        self.n = self.threshold.size
+        self.labels = None if labels is None else np.asarray(labels)
+        if self.labels is not None and self.labels.size != self.n:
+            raise ValueError('need one label per probability')
+        self.rng = get_rng(rng)
+
+    def sample(self, size, out=None, chunk_size=DEFAULT_CHUNK):
+        """Draw `size` category indices, writing them into `out` if given."""
+        if out is None:
+            out = np.empty(size, dtype=np.int64)
+        elif out.shape != (size,):
+            raise ValueError('out must have shape (%d,)' % size)
+        chunk = max(1, min(size, chunk_size))
+        uniform = np.empty(chunk)
+        index = np.empty(chunk, dtype=np.int64)
+        limit = np.empty(chunk)
+        for begin in range(0, size, chunk):
+            end = min(begin + chunk, size)
+            u, i, t = uniform[:end - begin], index[:end - begin], limit[:end - begin]
+            # One uniform gives both the column (integer part) and the coin
+            # flip inside the column (fractional part)
+            self.rng.random(out=u)
+            u *= self.n
+            np.copyto(i, u, casting='unsafe')
+            np.minimum(i, self.n - 1, out=i)
+            u -= i
+            np.take(self.threshold, i, out=t)
+            target = out[begin:end]
+            np.take(self.alias, i, out=target)
+            np.copyto(target, i, where=u < t)
+        return out
+
+    def sample_labels(self, size):
+        if self.labels is None:
+            raise ValueError('sampler has no labels')
+        return self.labels[self.sample(size)]
+
+    def counts(self, size, chunk_size=DEFAULT_CHUNK):
+        """Frequency of every category over `size` draws, in bounded memory."""
+        counts = np.zeros(self.n, dtype=np.int64)
+        buffer = np.empty(max(1, min(size, chunk_size)), dtype=np.int64)
+        for begin in range(0, size, buffer.size):
+            part = buffer[:min(buffer.size, size - begin)]
+            self.sample(part.size, out=part)
+            counts += np.bincount(part, minlength=self.n)
+        return counts
+
+
+def weather_sampler(rng=None):
+    """Sampler for the lesson's sunny/cloudy/rainy weather."""
+    return AliasSampler(list(WEATHER.values()), labels=list(WEATHER), rng=rng)
+
+
+def benchmark(categories=10**6, draws=10**7, seed=0):
+    """Time `AliasSampler` against `np.random.choice(p=...)`."""
+    import time
+
+    rng = np.random.default_rng(seed)
+    probs = rng.random(categories)
+    probs /= probs.sum()
+
+    start = time.perf_counter()
+    sampler = AliasSampler(probs, rng=seed)
+    build = time.perf_counter() - start
+    out = np.empty(draws, dtype=np.int64)
+    start = time.perf_counter()
+    sampler.sample(draws, out=out)
+    alias_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    np.random.choice(categories, size=draws, p=probs)
+    choice_time = time.perf_counter() - start
+    print('categories : %d   draws : %d' % (categories, draws))
+    print('alias build : %.3fs   alias draws : %.3fs   np.random.choice : %.3fs'
+          % (build, alias_time, choice_time))
+
+
+if __name__ == '__main__':
+    weather = weather_sampler(rng=0)
+    print(weather.sample_labels(7))
+    counts = weather.counts(10**7)
+    print(dict(zip(weather.labels.tolist(), (counts / counts.sum()).tolist())))
+    benchmark()
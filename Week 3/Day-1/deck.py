@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""A 52-card deck where every event is a bitmask.
+
+The set-theory part of the lesson works out aces, red cards, their
+intersection and union, and conditional probabilities by hand. Here each
+card is one bit of a 52-bit integer, so an `Event` is just a mask:
+
+* intersection / union / complement are `&`, `|` and `~`
+* the number of sample points is a popcount
+
+Multi-card questions ("what is the chance the first two cards are both
+jacks?", "at least 3 hearts in 5 cards?") are answered exactly, with
+`fractions.Fraction`, by counting how many cards of each *atom* (cells of
+the Venn diagram the events make) a hand holds, instead of enumerating all
+C(52, k) hands.
+
+    >>> ACES & RED
+    >>> sequence_probability([rank('J'), rank('J')])    # 1/221
+    >>> hand_probability(5, [(suit('hearts'), 3, None)])
+"""
+
+from fractions import Fraction
+from functools import lru_cache
+from math import comb
+
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+SUITS = ['hearts', 'spades', 'clubs', 'diamonds']
+SUIT_SYMBOLS = {'hearts': '♥', 'spades': '♠', 'clubs': '♣', 'diamonds': '♦'}
+
+DECK_SIZE = len(RANKS) * len(SUITS)
+FULL_MASK = (1 << DECK_SIZE) - 1
+
+
+def card_index(rank_name, suit_name):
+    return RANKS.index(rank_name) * len(SUITS) + SUITS.index(suit_name)
+
+
+def card_name(index):
+    rank_name, suit_name = RANKS[index // len(SUITS)], SUITS[index % len(SUITS)]
+    return rank_name + ' ' + SUIT_SYMBOLS[suit_name]
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+class Event:
+    """A set of cards, stored as a 52-bit mask."""
+
+    __slots__ = ('mask',)
+
+    def __init__(self, mask=0):
+        self.mask = mask & FULL_MASK
+
+    @classmethod
+    def of(cls, cards):
+        """Event from `(rank, suit)` pairs."""
+        mask = 0
+        for rank_name, suit_name in cards:
+            mask |= 1 << card_index(rank_name, suit_name)
+        return cls(mask)
+
+    def __and__(self, other):
+        return Event(self.mask & other.mask)
+
+    def __or__(self, other):
+        return Event(self.mask | other.mask)
+
+    def __sub__(self, other):
+        return Event(self.mask & ~other.mask)
+
+    def __invert__(self):
+        return Event(~self.mask)
+
+    def __eq__(self, other):
+        return isinstance(other, Event) and self.mask == other.mask
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __len__(self):
+        return _popcount(self.mask)
+
+    def __contains__(self, index):
+        return bool(self.mask >> index & 1)
+
+    def __iter__(self):
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __repr__(self):
+        return 'Event(%s)' % ', '.join(card_name(i) for i in self)
+
+    def probability(self, given=None):
+        """P(event) for one card, or P(event | given)."""
+        if given is None:
+            return Fraction(len(self), DECK_SIZE)
+        if not len(given):
+            raise ValueError('cannot condition on an empty event')
+        return Fraction(len(self & given), len(given))
+
+
+def rank(rank_name):
+    return Event.of((rank_name, s) for s in SUITS)
+
+
+def suit(suit_name):
+    return Event.of((r, suit_name) for r in RANKS)
+
+
+DECK = Event(FULL_MASK)
+ACES = rank('A')
+FACE_CARDS = rank('J') | rank('Q') | rank('K')
+RED = suit('hearts') | suit('diamonds')
+BLACK = ~RED
+
+
+def _atoms(events):
+    # Split the deck by which of `events` each card belongs to.
+    # Returns [(membership tuple, size)] for every non-empty atom.
+    sizes = {}
+    for index in range(DECK_SIZE):
+        key = tuple(index in event for event in events)
+        sizes[key] = sizes.get(key, 0) + 1
+    return sorted(sizes.items(), key=lambda item: item[0])
+
+
+def count_distribution(k, events):
+    """Exact distribution of how many cards of each event a k-card hand holds.
+
+    Returns `{(count_1, ..., count_m): Fraction}`. Any question about the
+    hand that only depends on these counts can be answered from it, e.g.
+    a flush is `max(counts) >= 5` with the four suits as events.
+    """
+    if not 0 <= k <= DECK_SIZE:
+        raise ValueError('k must be between 0 and %d' % DECK_SIZE)
+    events = list(events)
+    atoms = _atoms(events)
+    total = comb(DECK_SIZE, k)
+    capacity = sum(size for _, size in atoms)
+
+    # Go atom by atom, keeping {(cards taken, counts): ways}; hands that
+    # reach the same state are merged instead of enumerated one by one
+    states = {(0, (0,) * len(events)): 1}
+    for membership, size in atoms:
+        capacity -= size
+        new_states = {}
+        for (taken, counts), ways in states.items():
+            left = k - taken
+            # Take at least enough cards that the later atoms can hold the rest
+            for take in range(max(0, left - capacity), min(size, left) + 1):
+                key = (taken + take,
+                       tuple(c + take * m for c, m in zip(counts, membership)))
+                new_states[key] = new_states.get(key, 0) + ways * comb(size, take)
+        states = new_states
+    return {counts: Fraction(ways, total) for (_, counts), ways in states.items()}
+
+
+def hand_probability(k, conditions):
+    """P(a k-card hand meets every condition).
+
+    `conditions` is a list of `(event, at_least, at_most)`; `at_most` may be
+    `None`. Allocations that can no longer meet a bound are pruned while
+    enumerating, so only feasible count vectors are visited.
+    """
+    if not 0 <= k <= DECK_SIZE:
+        raise ValueError('k must be between 0 and %d' % DECK_SIZE)
+    events = [event for event, _, _ in conditions]
+    lows = [low or 0 for _, low, _ in conditions]
+    highs = [k if high is None else high for _, _, high in conditions]
+    atoms = _atoms(events)
+    # Cards still available for each event after atom i, for pruning
+    remaining = [[0] * len(events) for _ in range(len(atoms) + 1)]
+    for i in range(len(atoms) - 1, -1, -1):
+        membership, size = atoms[i]
+        remaining[i] = [r + size * m for r, m in zip(remaining[i + 1], membership)]
+    capacity = [0] * (len(atoms) + 1)
+    for i in range(len(atoms) - 1, -1, -1):
+        capacity[i] = capacity[i + 1] + atoms[i][1]
+
+    @lru_cache(maxsize=None)
+    def walk(i, left, counts):
+        if any(c > h for c, h in zip(counts, highs)):
+            return 0
+        if any(c + r < low for c, r, low in zip(counts, remaining[i], lows)):
+            return 0
+        if i == len(atoms):
+            return 1 if left == 0 else 0
+        membership, size = atoms[i]
+        ways = 0
+        for take in range(max(0, left - capacity[i + 1]), min(size, left) + 1):
+            new_counts = tuple(c + take * m for c, m in zip(counts, membership))
+            ways += comb(size, take) * walk(i + 1, left - take, new_counts)
+        return ways
+
+    return Fraction(walk(0, k, (0,) * len(events)), comb(DECK_SIZE, k))
+
+
+def sequence_probability(events):
+    """P(the 1st card is in events[0], the 2nd in events[1], ...).
+
+    Cards are drawn without replacement, e.g.
+    `sequence_probability([rank('J'), rank('J')])` is 4/52 x 3/51 = 1/221.
+    """
+    events = list(events)
+    atoms = _atoms(events)
+    memberships = [membership for membership, _ in atoms]
+
+    @lru_cache(maxsize=None)
+    def draw(position, sizes):
+        if position == len(events):
+            return Fraction(1)
+        left = sum(sizes)
+        total = Fraction(0)
+        for a, size in enumerate(sizes):
+            if size and memberships[a][position]:
+                rest = sizes[:a] + (size - 1,) + sizes[a + 1:]
+                total += Fraction(size, left) * draw(position + 1, rest)
+        return total
+
+    if len(events) > DECK_SIZE:
+        return Fraction(0)
+    return draw(0, tuple(size for _, size in atoms))
+
+
+def brute_force_probability(k, predicate):
+    """Check by enumerating every k-card hand (only usable for small k)."""
+    from itertools import combinations
+
+    hits = sum(1 for hand in combinations(range(DECK_SIZE), k) if predicate(hand))
+    return Fraction(hits, comb(DECK_SIZE, k))
+
+
+if __name__ == '__main__':
+    import time
+
+    print('P(ace)            : ', ACES.probability())
+    print('P(red)            : ', RED.probability())
+    print('P(ace and red)    : ', (ACES & RED).probability())
+    print('P(ace or red)     : ', (ACES | RED).probability())
+    print('P(ace | red)      : ', ACES.probability(given=RED))
+    print('P(two jacks)      : ', sequence_probability([rank('J'), rank('J')]))
+
+    suits = [suit(s) for s in SUITS]
+    start = time.perf_counter()
+    flush = sum(p for counts, p in count_distribution(5, suits).items() if max(counts) == 5)
+    print('P(5-card flush)   : ', flush, ' (%.4fs)' % (time.perf_counter() - start))
+
+    ranks = [rank(r) for r in RANKS]
+    start = time.perf_counter()
+    quads = sum(p for counts, p in count_distribution(7, ranks).items() if max(counts) == 4)
+    print('P(quads in 7)     : ', quads, ' (%.4fs)' % (time.perf_counter() - start))
+
+    start = time.perf_counter()
+    hearts = hand_probability(13, [(suit('hearts'), 5, None), (ACES, 2, 2)])
+    print('P(5+ hearts, 2 aces in 13) : %.6f (%.4fs)' % (hearts, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    check = brute_force_probability(3, lambda hand: sum(i in ACES for i in hand) >= 2)
+    print('brute force check : ', check == hand_probability(3, [(ACES, 2, None)]),
+          ' (%.4fs)' % (time.perf_counter() - start))
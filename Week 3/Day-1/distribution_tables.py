@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Cached PMF/CDF tables for the binomial and Poisson distributions.
+
+The lesson builds probabilities with one scipy call per value, e.g.
+`np.array([binom.pmf(k, n, p) for k in x])`, and recomputes the same
+`(n, p)` in several cells. A `DistributionTable` evaluates the whole support
+in one vectorized call and keeps `pmf` and `cdf` arrays; `TableService`
+keeps the most recently used tables in a size-bounded LRU cache keyed by
+`(family, params)` and answers `pmf`, `cdf` and `ppf` lookups from them.
+
+    >>> tables = TableService(maxsize=256)
+    >>> tables.pmf('binom', [0, 1, 2], n=5, p=0.25)
+    >>> tables.ppf('poisson', 0.99, mu=3)
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.stats import binom, poisson
+
+# The Poisson support is cut where the upper tail drops below this value
+POISSON_TAIL = 1e-16
+
+
+class DistributionTable:
+    """PMF and CDF of a discrete distribution over its support `0..kmax`."""
+
+    def __init__(self, family, params, pmf, upper=None):
+        self.family = family
+        self.params = params
+        self.pmf_values = np.asarray(pmf, dtype=np.float64)
+        # Right end of the true support (np.inf when the table is cut)
+        self.upper = self.pmf_values.size - 1 if upper is None else upper
+        self.cdf_values = np.minimum(np.cumsum(self.pmf_values), 1.0)
+        # Tables are shared between callers, so keep them read-only
+        self.pmf_values.setflags(write=False)
+        self.cdf_values.setflags(write=False)
+
+    @property
+    def support(self):
+        return np.arange(self.pmf_values.size)
+
+    def _index(self, k):
+        k = np.asarray(k, dtype=np.float64)
+        inside = (k >= 0) & (k < self.pmf_values.size)
+        return k, inside
+
+    def pmf(self, k):
+        k, inside = self._index(k)
+        whole = inside & (k == np.floor(k))
+        index = np.where(whole, k, 0).astype(np.int64)
+        return np.where(whole, self.pmf_values[index], 0.0)
+
+    def cdf(self, k):
+        k = np.floor(np.asarray(k, dtype=np.float64))
+        index = np.clip(k, 0, self.cdf_values.size - 1).astype(np.int64)
+        return np.where(k < 0, 0.0, self.cdf_values[index])
+
+    def ppf(self, q):
+        """Smallest `k` with `cdf(k) >= q`, like `scipy.stats` does."""
+        q = np.asarray(q, dtype=np.float64)
+        index = np.searchsorted(self.cdf_values, q, side='left')
+        result = np.minimum(index, self.cdf_values.size - 1).astype(np.float64)
+        result = np.where(q == 0, -1.0, np.where(q == 1, self.upper, result))
+        return np.where((q < 0) | (q > 1) | np.isnan(q), np.nan, result)
+
+
+def binom_table(n, p):
+    """Build the table of `binom(n, p)` with one vectorized `pmf` call."""
+    n = int(n)
+    if n < 0 or not 0 <= p <= 1:
+        raise ValueError('binom needs n >= 0 and 0 <= p <= 1')
+    return DistributionTable('binom', (n, p), binom.pmf(np.arange(n + 1), n, p))
+
+
+def poisson_table(mu):
+    """Build the table of `poisson(mu)`, cut where the tail is negligible."""
+    if mu < 0:
+        raise ValueError('poisson needs mu >= 0')
+    kmax = int(poisson.isf(POISSON_TAIL, mu)) if mu > 0 else 0
+    pmf = poisson.pmf(np.arange(kmax + 1), mu)
+    return DistributionTable('poisson', (mu,), pmf, upper=np.inf if mu > 0 else 0)
+
+
+BUILDERS = {
+    'binom': binom_table,
+    'poisson': poisson_table,
+}
+
+
+class TableService:
+    """Size-bounded LRU cache of distribution tables.
+
+    `maxsize` is the number of tables kept; the least recently used one is
+    dropped when a new table does not fit. Safe to share between threads.
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tables)
+
+    def table(self, family, **params):
+        if family not in BUILDERS:
+            raise ValueError('unknown family %r, expected one of %s'
+                             % (family, sorted(BUILDERS)))
+        key = (family, tuple(sorted(params.items())))
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                return table
+            self.misses += 1
+        # Build outside the lock so slow builds do not block lookups
+        table = BUILDERS[family](**params)
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+        return table
+
+    def pmf(self, family, k, **params):
+        return self.table(family, **params).pmf(k)
+
+    def cdf(self, family, k, **params):
+        return self.table(family, **params).cdf(k)
+
+    def ppf(self, family, q, **params):
+        return self.table(family, **params).ppf(q)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self.hits = self.misses = 0
+
+
+if __name__ == '__main__':
+    import time
+
+    tables = TableService()
+
+    # Same values as `np.array([binom.pmf(k, n, p) for k in x])`
+    n, p = 100, 0.25
+    x = np.arange(0, n + 1)
+    prob = tables.pmf('binom', x, n=n, p=p)
+    print(np.allclose(prob, [binom.pmf(k, n, p) for k in x]))
+    print(tables.ppf('poisson', [0.00001, 0.99999], mu=1))
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        np.array([binom.pmf(k, n, p) for k in x])
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(1000):
+        tables.pmf('binom', x, n=n, p=p)
+    cached = time.perf_counter() - start
+    print('list comprehension : %.4fs   cached table : %.4fs' % (loop, cached))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Batched simulation of card hands drawn without replacement.
+
+The jacks example in the lesson is worked out analytically as
+4/52 x 3/51. To check results like that by simulation we deal millions of
+hands, and a `random.sample` loop is far too slow. `deal_hands` deals a
+whole batch as a `(hands, cards)` matrix instead, with one of two
+vectorized methods:
+
+* `'fisher-yates'` : a partial Fisher-Yates shuffle run on every row at
+  once, k column swaps for k cards (keeps the draw order),
+* `'argpartition'` : one random key per card and `np.argpartition` to keep
+  the k smallest keys (hand order is random, not draw order).
+
+Events from `deck.py` are evaluated on whole batches: every hand becomes a
+52-bit mask, so "how many aces" is a popcount of `hand & ACES`.
+
+    >>> hands = deal_hands(10**6, 2, rng=0)
+    >>> (event_counts(hands, rank('J')) == 2).mean()      # ~ 1/221
+    >>> estimate(lambda h: first_cards_in(h, [rank('J'), rank('J')]), 10**7, 2)
+"""
+
+import numpy as np
+
+from deck import DECK_SIZE, rank
+from montecarlo import get_rng, popcount
+
+DEFAULT_CHUNK = 1 << 18
+
+
+def deal_hands(n_hands, k, rng=None, method='fisher-yates'):
+    """Deal `n_hands` hands of `k` cards, as an `(n_hands, k)` int8 matrix."""
+    if not 0 <= k <= DECK_SIZE:
+        raise ValueError('k must be between 0 and %d' % DECK_SIZE)
+    rng = get_rng(rng)
+    if method == 'fisher-yates':
+        decks = np.tile(np.arange(DECK_SIZE, dtype=np.int8), (n_hands, 1))
+        rows = np.arange(n_hands)
+        for i in range(k):
+            # Swap column i with a random column in i..51, in every row
+            j = rng.integers(i, DECK_SIZE, size=n_hands)
+            picked = decks[rows, j]
+            decks[rows, j] = decks[:, i]
+            decks[:, i] = picked
+        return np.ascontiguousarray(decks[:, :k])
+    if method == 'argpartition':
+        if k == 0:
+            return np.empty((n_hands, 0), dtype=np.int8)
+        keys = rng.random((n_hands, DECK_SIZE), dtype=np.float32)
+        return np.argpartition(keys, k - 1, axis=1)[:, :k].astype(np.int8)
+    raise ValueError("method must be 'fisher-yates' or 'argpartition'")
+
+
+def hand_masks(hands):
+    """52-bit mask of every hand, as a uint64 array."""
+    bits = np.left_shift(np.uint64(1), hands.astype(np.uint64))
+    return np.bitwise_or.reduce(bits, axis=1)
+
+
+def event_counts(hands, event):
+    """Number of cards of `event` in every hand."""
+    return popcount(hand_masks(hands) & np.uint64(event.mask)).astype(np.int64)
+
+
+def first_cards_in(hands, events):
+    """True where the i-th card drawn is in `events[i]` for every i.
+
+    Needs hands in draw order, i.e. dealt with `method='fisher-yates'`.
+    """
+    result = np.ones(hands.shape[0], dtype=bool)
+    for position, event in enumerate(events):
+        member = np.zeros(DECK_SIZE, dtype=bool)
+        member[list(event)] = True
+        result &= member[hands[:, position]]
+    return result
+
+
+def estimate(predicate, n_hands, k, rng=None, chunk_size=DEFAULT_CHUNK,
+             method='fisher-yates'):
+    """Share of `n_hands` random k-card hands where `predicate(hands)` holds.
+
+    `predicate` takes a `(batch, k)` matrix and returns a boolean array.
+    Hands are dealt in chunks, so memory does not grow with `n_hands`.
+    Returns `(estimate, standard error)`.
+    """
+    if n_hands <= 0:
+        raise ValueError('n_hands must be positive')
+    if chunk_size <= 0:
+        raise ValueError('chunk_size must be positive')
+    rng = get_rng(rng)
+    hits = 0
+    for begin in range(0, n_hands, chunk_size):
+        size = min(chunk_size, n_hands - begin)
+        hits += int(np.count_nonzero(predicate(deal_hands(size, k, rng, method))))
+    share = hits / n_hands
+    return share, (share * (1 - share) / n_hands) ** 0.5
+
+
+if __name__ == '__main__':
+    import random
+    import time
+
+    from deck import sequence_probability
+
+    jacks = rank('J')
+    n = 10**7
+    start = time.perf_counter()
+    share, error = estimate(lambda h: first_cards_in(h, [jacks, jacks]), n, 2, rng=0)
+    batched = time.perf_counter() - start
+    print('two jacks : simulated %.6f +/- %.6f   exact %.6f   (%.2fs for %d hands)'
+          % (share, error, float(sequence_probability([jacks, jacks])), batched, n))
+
+    loop_n = 10**5
+    jack_cards = set(jacks)
+    start = time.perf_counter()
+    sum(all(card in jack_cards for card in random.sample(range(DECK_SIZE), 2))
+        for _ in range(loop_n))
+    loop = (time.perf_counter() - start) * n / loop_n
+    print('random.sample loop (extrapolated to %d hands) : %.2fs' % (n, loop))
+
+    for method in ('fisher-yates', 'argpartition'):
+        start = time.perf_counter()
+        hands = deal_hands(10**6, 5, rng=1, method=method)
+        print('%-12s 1e6 five-card hands : %.3fs' % (method, time.perf_counter() - start))
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Markov chains on a categorical sample space, such as the weather.
+
+The lesson treats every day's weather as independent (60% sunny, 30%
+cloudy, 10% rainy). A `MarkovChain` adds day-to-day dependence through a
+transition matrix `P`, where `P[i, j]` is the chance of state `j` tomorrow
+given state `i` today.
+
+* `simulate` runs millions of chains at once: every row of `P` gets an
+  alias table (see `categorical.py`), so one step is a vectorized O(1)
+  update of all chains.
+* `n_step`, `distribution_after` and `stationary_distribution` are exact,
+  by matrix power and eigen decomposition, with no simulation.
+
+    >>> chain = weather_chain(persistence=0.5)
+    >>> chain.stationary_distribution()       # still 60/30/10
+    >>> chain.simulate(10**6, steps=7)
+"""
+
+import numpy as np
+
+from categorical import WEATHER, AliasSampler, build_alias_table
+from montecarlo import get_rng
+
+DEFAULT_CHUNK = 1 << 20
+
+
+class MarkovChain:
+    """Discrete-time Markov chain with a row-stochastic transition matrix."""
+
+    def __init__(self, transition, labels=None):
+        P = np.array(transition, dtype=np.float64)
+        if P.ndim != 2 or P.shape[0] != P.shape[1]:
+            raise ValueError('transition must be a square matrix')
+        if (P < 0).any() or not np.allclose(P.sum(axis=1), 1):
+            raise ValueError('every row of transition must be a probability vector')
+        self.P = P
+        self.k = P.shape[0]
+        self.labels = None if labels is None else np.asarray(labels)
+        if self.labels is not None and self.labels.size != self.k:
+            raise ValueError('need one label per state')
+        # Alias table of every row, for O(1) vectorized steps
+        tables = [build_alias_table(row) for row in P]
+        self._threshold = np.concatenate([t for t, _ in tables])
+        self._alias = np.concatenate([a for _, a in tables])
+
+    def n_step(self, n):
+        """Matrix of n-step transition probabilities, `P**n`."""
+        return np.linalg.matrix_power(self.P, n)
+
+    def distribution_after(self, n, initial=None):
+        """Distribution of the state after `n` steps from `initial`."""
+        return self._initial(initial) @ self.n_step(n)
+
+    def stationary_distribution(self):
+        """The `pi` with `pi @ P == pi`, from the eigenvector for eigenvalue 1."""
+        values, vectors = np.linalg.eig(self.P.T)
+        index = np.argmin(np.abs(values - 1))
+        pi = np.real(vectors[:, index])
+        pi = pi / pi.sum()
+        if not np.allclose(pi @ self.P, pi) or (pi < -1e-12).any():
+            # Reducible chain: fall back to least squares on pi (P - I) = 0, sum = 1
+            A = np.vstack([self.P.T - np.eye(self.k), np.ones(self.k)])
+            b = np.concatenate([np.zeros(self.k), [1.0]])
+            pi = np.linalg.lstsq(A, b, rcond=None)[0]
+        return np.clip(pi, 0, None) / np.clip(pi, 0, None).sum()
+
+    def _initial(self, initial):
+        if initial is None:
+            return self.stationary_distribution()
+        if np.isscalar(initial) or isinstance(initial, str):
+            state = self.state_index(initial)
+            vector = np.zeros(self.k)
+            vector[state] = 1.0
+            return vector
+        vector = np.asarray(initial, dtype=np.float64)
+        if vector.shape != (self.k,):
+            raise ValueError('initial must be a state or a distribution over %d states' % self.k)
+        return vector / vector.sum()
+
+    def state_index(self, state):
+        if isinstance(state, str):
+            if self.labels is None:
+                raise ValueError('chain has no labels')
+            return int(np.flatnonzero(self.labels == state)[0])
+        return int(state)
+
+    def step(self, states, rng=None):
+        """Advance every chain in `states` by one step, in place."""
+        rng = get_rng(rng)
+        u = rng.random(states.size) * self.k
+        column = np.minimum(u.astype(np.int64), self.k - 1)
+        u -= column
+        # Tables are stored row after row, so (state, column) is one index
+        cell = states * self.k + column
+        keep = u < self._threshold[cell]
+        states[:] = np.where(keep, column, self._alias[cell])
+        return states
+
+    def simulate(self, n_chains, steps, initial=None, rng=None, return_path=False):
+        """Run `n_chains` independent chains for `steps` steps.
+
+        Returns the final state of every chain, or the `(steps + 1, n_chains)`
+        array of visited states when `return_path` is true.
+        """
+        rng = get_rng(rng)
+        start = self._initial(initial)
+        states = AliasSampler(start, rng=rng).sample(n_chains)
+        if return_path:
+            path = np.empty((steps + 1, n_chains), dtype=np.int64)
+            path[0] = states
+        for t in range(steps):
+            self.step(states, rng)
+            if return_path:
+                path[t + 1] = states
+        return path if return_path else states
+
+    def simulated_distribution(self, n_chains, steps, initial=None, rng=None,
+                               chunk_size=DEFAULT_CHUNK):
+        """Share of chains in every state after `steps`, in bounded memory."""
+        rng = get_rng(rng)
+        counts = np.zeros(self.k, dtype=np.int64)
+        for begin in range(0, n_chains, chunk_size):
+            size = min(chunk_size, n_chains - begin)
+            final = self.simulate(size, steps, initial, rng)
+            counts += np.bincount(final, minlength=self.k)
+        return counts / n_chains
+
+
+def weather_chain(persistence=0.5):
+    """Weather chain whose long-run share of days is the lesson's 60/30/10.
+
+    Each day keeps yesterday's weather with probability `persistence`,
+    otherwise it is drawn from the independent model. `persistence=0` gives
+    back the lesson's independent days.
+    """
+    if not 0 <= persistence < 1:
+        raise ValueError('persistence must be in [0, 1)')
+    pi = np.array(list(WEATHER.values()))
+    P = persistence * np.eye(pi.size) + (1 - persistence) * np.tile(pi, (pi.size, 1))
+    return MarkovChain(P, labels=list(WEATHER))
+
+
+def cross_check(chain, steps=5, n_chains=10**6, initial=None, rng=None, sigmas=4):
+    """Largest gap between simulated and exact state shares after `steps`.
+
+    Raises AssertionError when the gap is above `sigmas` binomial standard
+    errors of a share (at most sqrt(0.25 / n_chains)), so the two paths
+    actually check each other.
+    """
+    exact = chain.distribution_after(steps, initial)
+    simulated = chain.simulated_distribution(n_chains, steps, initial, rng)
+    gap = float(np.abs(simulated - exact).max())
+    limit = sigmas * np.sqrt(0.25 / n_chains)
+    if not gap <= limit:
+        raise AssertionError('simulated shares are %.2e from exact, above %.2e' % (gap, limit))
+    return gap
+
+
+if __name__ == '__main__':
+    import time
+
+    chain = weather_chain(persistence=0.5)
+    print('transition matrix :\n', chain.P)
+    print('stationary        : ', chain.stationary_distribution())
+    print('after 3 days from rainy : ', chain.distribution_after(3, 'rainy'))
+
+    start = time.perf_counter()
+    final = chain.simulate(10**6, steps=30, initial='rainy', rng=0)
+    elapsed = time.perf_counter() - start
+    print('1e6 chains x 30 days : %.3fs   shares : %s'
+          % (elapsed, np.bincount(final, minlength=chain.k) / final.size))
+    print('max gap simulated vs exact : %.2e'
+          % cross_check(chain, steps=3, initial='rainy', rng=1))
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Vectorized Monte Carlo helpers for the coin-toss simulations.
+
+The lesson (`p0w3d1pm_probability_&_distribution.py`) simulates coin tosses
+with a `while trial < trials` loop and one `random.randint(0,1)` call per
+toss. The functions here give the same results, but generate the trials in
+fixed-size NumPy batches from a `numpy.random.Generator`, so the memory used
+does not depend on the number of trials.
+
+Conventions follow the lesson: a toss of `0` is *heads* and `1` is *tails*.
+"""
+
+import random
+import time
+
+import numpy as np
+
+# Number of trials generated per batch
+DEFAULT_BATCH = 1 << 20
+
+_WORD_BITS = 64
+
+# Longest sequence a SequenceTally can hold (2**k int64 counts)
+MAX_SEQUENCE_LENGTH = 26
+
+
+def get_rng(rng=None):
+    """A `numpy.random.Generator` from a Generator, a seed, or nothing."""
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def popcount(words):
+    """Number of set bits in every word of a uint64 array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    return np.unpackbits(words.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _batches(trials, batch_size):
+    # Split `trials` into sizes of at most `batch_size`
+    trials = int(trials)
+    if trials < 0:
+        raise ValueError('trials must be non-negative')
+    if batch_size <= 0:
+        raise ValueError('batch_size must be positive')
+    full, rest = divmod(trials, batch_size)
+    for _ in range(full):
+        yield batch_size
+    if rest:
+        yield rest
+
+
+def toss_coins(trials, batch_size=DEFAULT_BATCH, rng=None):
+    """Toss a fair coin `trials` times and return `[heads, tails]`.
+
+    Every random 64-bit word holds 64 tosses, the tails are counted with a
+    popcount, and the heads are whatever is left.
+    """
+    rng = get_rng(rng)
+    tails = 0
+    for size in _batches(trials, batch_size):
+        n_words, rest = divmod(size, _WORD_BITS)
+        words = rng.integers(0, np.iinfo(np.uint64).max, size=n_words + bool(rest),
+                             dtype=np.uint64, endpoint=True)
+        if rest:
+            # Only keep the low `rest` bits of the last word
+            words[-1] &= np.uint64((1 << rest) - 1)
+        tails += int(popcount(words).sum(dtype=np.int64))
+    return [int(trials) - tails, tails]
+
+
+def toss_sequence_counts(trials, k=3, batch_size=DEFAULT_BATCH, rng=None):
+    """Toss `k` coins per trial and count every outcome.
+
+    Each trial is drawn as a single integer in `[0, 2**k)` whose bits are the
+    `k` tosses (first toss in the most significant bit, `0` = heads), and the
+    outcomes are tallied with `np.bincount`. The result has `2**k` entries, so
+    `counts[0]` is the number of all-heads trials.
+    """
+    tally = SequenceTally(k)
+    tally.update(trials, batch_size, rng)
+    return tally.counts
+
+
+class SequenceTally:
+    """Streaming frequency table of k-toss sequences.
+
+    Only the `2**k` counts are kept, never the individual results, so the
+    memory used is the same for 10 trials or 10**10 trials. Tallies with the
+    same `k` can be added together with `merge`.
+    """
+
+    def __init__(self, k=3):
+        if not 1 <= k <= MAX_SEQUENCE_LENGTH:
+            raise ValueError('k must be between 1 and %d' % MAX_SEQUENCE_LENGTH)
+        self.k = k
+        self.counts = np.zeros(1 << k, dtype=np.int64)
+
+    @property
+    def trials(self):
+        return int(self.counts.sum())
+
+    def update(self, trials, batch_size=DEFAULT_BATCH, rng=None):
+        """Simulate `trials` more sequences and add them to the table."""
+        rng = get_rng(rng)
+        size_table = 1 << self.k
+        for size in _batches(trials, batch_size):
+            outcomes = rng.integers(0, size_table, size=size, dtype=np.int64)
+            self.counts += np.bincount(outcomes, minlength=size_table)
+        return self
+
+    def add(self, codes):
+        """Add already packed sequences (see `encode`) to the table."""
+        codes = np.asarray(codes, dtype=np.int64).ravel()
+        self.counts += np.bincount(codes, minlength=1 << self.k)
+        return self
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError('cannot merge tallies with different k')
+        self.counts += other.counts
+        return self
+
+    def encode(self, pattern):
+        """Pack a sequence such as `'HTH'` or `['H','T','H']` into an integer."""
+        code, _ = self._mask(pattern)
+        return code
+
+    def decode(self, code):
+        return ''.join('T' if (code >> (self.k - 1 - i)) & 1 else 'H'
+                       for i in range(self.k))
+
+    def _mask(self, pattern):
+        # Returns (value, mask): '?' positions are left out of the mask
+        if len(pattern) != self.k:
+            raise ValueError('pattern must have %d tosses' % self.k)
+        value = mask = 0
+        for toss in pattern:
+            toss = str(toss).upper()
+            if toss not in ('H', 'T', '?'):
+                raise ValueError("tosses must be 'H', 'T' or '?'")
+            value = (value << 1) | (toss == 'T')
+            mask = (mask << 1) | (toss != '?')
+        return value, mask
+
+    def count(self, pattern):
+        """Number of trials that matched `pattern` (`'?'` matches anything)."""
+        value, mask = self._mask(pattern)
+        if mask == (1 << self.k) - 1:
+            return int(self.counts[value])
+        codes = np.arange(1 << self.k)
+        return int(self.counts[(codes & mask) == value].sum())
+
+    def probability(self, pattern):
+        """Estimated probability of `pattern`, e.g. `probability('HHH')`."""
+        trials = self.trials
+        if trials == 0:
+            raise ValueError('no trials have been tallied yet')
+        return self.count(pattern) / trials
+
+    def frequencies(self):
+        """Return `{sequence: count}` for every possible sequence."""
+        return {self.decode(code): int(c) for code, c in enumerate(self.counts)}
+
+
+def count_three_heads(trials, batch_size=DEFAULT_BATCH, rng=None):
+    """Return `h3`, the number of trials where three coins are all heads."""
+    return int(toss_sequence_counts(trials, 3, batch_size, rng)[0])
+
+
+def loop_toss_coins(trials):
+    """The lesson's original loop, kept as a reference for benchmarks."""
+    heads_tails = [0, 0]
+    trial = 0
+    while trial < trials:
+        trial = trial + 1
+        toss = random.randint(0, 1)
+        heads_tails[toss] = heads_tails[toss] + 1
+    return heads_tails
+
+
+def loop_count_three_heads(trials):
+    """The lesson's original three-heads loop, without keeping `results`."""
+    h3 = 0
+    trial = 0
+    while trial < trials:
+        trial = trial + 1
+        result = ['H' if random.randint(0, 1) == 0 else 'T',
+                  'H' if random.randint(0, 1) == 0 else 'T',
+                  'H' if random.randint(0, 1) == 0 else 'T']
+        h3 = h3 + int(result == ['H', 'H', 'H'])
+    return h3
+
+
+def benchmark(trials=10**6, repeat=3):
+    """Time the loops against the batched versions and print the speed-up."""
+    cases = [('coin toss', loop_toss_coins, toss_coins),
+             ('three heads', loop_count_three_heads, count_three_heads)]
+    for name, loop_fn, fast_fn in cases:
+        loop_time = min(_timeit(loop_fn, trials) for _ in range(repeat))
+        fast_time = min(_timeit(fast_fn, trials) for _ in range(repeat))
+        print('%-12s loop: %8.4fs   batched: %8.4fs   speed-up: %7.1fx'
+              % (name, loop_time, fast_time, loop_time / fast_time))
+
+
+def _timeit(fn, trials):
+    start = time.perf_counter()
+    fn(trials)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(toss_coins(10000, rng=0))
+    print('%.2f%%' % (count_three_heads(10000, rng=0) / 10000 * 100))
+    tally = SequenceTally(3).update(10000, rng=0)
+    print(tally.frequencies())
+    print('P(H?H) : ', tally.probability('H?H'))
+    benchmark()
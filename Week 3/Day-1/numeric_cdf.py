@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""CDF and quantiles of any density function, by adaptive integration.
+
+The lesson's CDF demo evaluates `my_dist` on `np.arange(-3, 3, 0.001)`,
+normalizes with `Y /= (dx * Y).sum()` and integrates with `np.cumsum(Y * dx)`:
+a fixed grid whose error is unknown and which is rebuilt on every call.
+
+`NumericalDistribution` wraps a density callable instead. It integrates it
+once with vectorized adaptive Simpson's rule, refining only the panels whose
+error estimate is above the tolerance, and keeps the resulting grid of
+`(x, pdf, cdf)` nodes. `cdf(x)` and `ppf(q)` are then answered for whole
+arrays by cubic Hermite interpolation on that cached grid (the slopes are
+the density itself, since the CDF is its integral).
+
+    >>> dist = NumericalDistribution(my_dist)
+    >>> dist.cdf([-1.96, 0, 1.96])
+    >>> dist.ppf([0.025, 0.975])
+"""
+
+import numpy as np
+
+# Initial number of panels and maximum number of refinements
+INITIAL_PANELS = 64
+MAX_LEVELS = 40
+
+# The density is treated as zero once it drops below this fraction of its peak
+TAIL_CUTOFF = 1e-16
+
+# Infinite tails are probed at loc -/+ scale * 2**(j / PROBES_PER_OCTAVE),
+# out to scale * 2**TAIL_OCTAVES
+PROBES_PER_OCTAVE = 8
+TAIL_OCTAVES = 60
+
+
+def _probe(density, x):
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        values = np.asarray(density(x), dtype=np.float64)
+    return np.where(np.isfinite(values), values, 0.0)
+
+
+def _tail_probes(loc, direction, scale):
+    # The whole tail is probed, not just up to the first negligible value,
+    # so a second mode far from `loc` is not cut off
+    steps = scale * np.exp2(np.arange(PROBES_PER_OCTAVE * TAIL_OCTAVES + 1) / PROBES_PER_OCTAVE)
+    return loc + direction * steps
+
+
+def _simpson(fa, fm, fb, width):
+    return width / 6 * (fa + 4 * fm + fb)
+
+
+class NumericalDistribution:
+    """Distribution defined by a (possibly unnormalized) density callable.
+
+    `density` must accept a NumPy array and return an array of the same
+    shape. `lower`/`upper` may be infinite: the tails are then probed on a
+    geometric grid around `loc` (the finite bound, or 0, by default) out to
+    `scale * 2**TAIL_OCTAVES`, and cut past the last point where the
+    density is above `TAIL_CUTOFF` of its peak, where the probes show less
+    than `tol / 4` of the mass beyond the cut. A bump narrower than
+    the probe spacing (about 9% of its distance from `loc`) can still be
+    missed, so give `loc`/`scale` or finite bounds for such densities.
+    `tol` is the absolute error bound on the CDF.
+    """
+
+    def __init__(self, density, lower=-np.inf, upper=np.inf, tol=1e-10, scale=1.0, loc=None):
+        if tol <= 0:
+            raise ValueError('tol must be positive')
+        if scale <= 0:
+            raise ValueError('scale must be positive')
+        self.density = density
+        self.tol = tol
+        lower, upper, probes = self._bounds(density, lower, upper, scale, loc, tol)
+        self.lower, self.upper = lower, upper
+        self._build(lower, upper, probes)
+
+    @staticmethod
+    def _bounds(density, lower, upper, scale, loc, tol):
+        if loc is None:
+            finite = [b for b in (lower, upper) if np.isfinite(b)]
+            loc = float(np.mean(finite)) if finite else 0.0
+        x = [np.linspace(loc - scale, loc + scale, 101)]
+        if not np.isfinite(lower):
+            x.append(_tail_probes(loc, -1, scale))
+        if not np.isfinite(upper):
+            x.append(_tail_probes(loc, 1, scale))
+        x = np.unique(np.concatenate(x))
+        x = x[(x >= lower) & (x <= upper)]
+        values = _probe(density, x)
+        # Trapezoid mass between probes, and the mass outside each probe
+        mass = (values[:-1] + values[1:]) / 2 * np.diff(x)
+        budget = tol / 4 * mass.sum()
+        below = np.concatenate([[0.0], np.cumsum(mass)])
+        beyond = np.concatenate([np.cumsum(mass[::-1])[::-1], [0.0]])
+        # An edge must be past every non-negligible value and leave out
+        # less than a quarter of the error budget
+        above = np.flatnonzero(values > TAIL_CUTOFF * values.max())
+        if not np.isfinite(lower):
+            first = above[0] if above.size else np.searchsorted(x, loc)
+            edges = np.flatnonzero(below[:first] <= budget)
+            if not edges.size or edges[-1] == 0 and values[0] > 0:
+                raise ValueError('density does not vanish in the lower tail')
+            lower = x[edges[-1]]
+        if not np.isfinite(upper):
+            last = above[-1] if above.size else np.searchsorted(x, loc)
+            edges = last + 1 + np.flatnonzero(beyond[last + 1:] <= budget)
+            if not edges.size or edges[0] == x.size - 1 and values[-1] > 0:
+                raise ValueError('density does not vanish in the upper tail')
+            upper = x[edges[0]]
+        if not lower < upper:
+            raise ValueError('lower must be smaller than upper')
+        # The probes become panel edges, so the panels that found mass far
+        # out are refined instead of being skipped by a coarse first grid
+        return lower, upper, x[(x > lower) & (x < upper)]
+
+    def _build(self, lower, upper, nodes=()):
+        span = upper - lower
+        a = np.union1d(np.linspace(lower, upper, INITIAL_PANELS + 1), nodes)
+        a, b = a[:-1], a[1:]
+        fa, fb = self.density(a), self.density(b)
+        fm = self.density((a + b) / 2)
+        f = np.concatenate([fa, fm, fb])
+        if not np.isfinite(f).all():
+            raise ValueError('density is not finite on the grid; move the bounds '
+                             'inside any singularity')
+        done = []
+        for level in range(MAX_LEVELS):
+            m = (a + b) / 2
+            width = b - a
+            fl = self.density((a + m) / 2)
+            fr = self.density((m + b) / 2)
+            whole = _simpson(fa, fm, fb, width)
+            left = _simpson(fa, fl, fm, width / 2)
+            right = _simpson(fm, fr, fb, width / 2)
+            # Each panel gets a share of the error budget matching its width
+            ok = np.abs(left + right - whole) <= 15 * self.tol * width / span
+            if level == MAX_LEVELS - 1:
+                ok[:] = True
+            done.append((a[ok], m[ok], fa[ok], fm[ok], left[ok], right[ok]))
+            if ok.all():
+                break
+            # Split the remaining panels in two
+            keep = ~ok
+            a = np.concatenate([a[keep], m[keep]])
+            b = np.concatenate([m[keep], b[keep]])
+            fa, fm, fb = (np.concatenate([fa[keep], fm[keep]]),
+                          np.concatenate([fl[keep], fr[keep]]),
+                          np.concatenate([fm[keep], fb[keep]]))
+
+        a, m, fa, fm, left, right = (np.concatenate(parts) for parts in zip(*done))
+        order = np.argsort(a)
+        a, m, fa, fm, left, right = (v[order] for v in (a, m, fa, fm, left, right))
+
+        # Grid nodes are every panel start and middle, plus the upper bound
+        x = np.empty(2 * a.size + 1)
+        x[0:-1:2], x[1::2], x[-1] = a, m, upper
+        f = np.empty_like(x)
+        f[0:-1:2], f[1::2] = fa, fm
+        f[-1] = self.density(np.array([upper]))[0]
+        pieces = np.empty(2 * a.size)
+        pieces[0::2], pieces[1::2] = left, right
+        cdf = np.concatenate([[0.0], np.cumsum(pieces)])
+
+        self.total = cdf[-1]
+        if not np.isfinite(self.total):
+            raise ValueError('density does not integrate to a finite total; move '
+                             'the bounds inside any singularity')
+        if not self.total > 0:
+            raise ValueError('density integrates to zero')
+        self.x = x
+        self.pdf_values = f / self.total
+        self.cdf_values = np.maximum.accumulate(cdf / self.total)
+
+    def pdf(self, x):
+        """Normalized density at `x`."""
+        x = np.asarray(x, dtype=np.float64)
+        inside = (x >= self.lower) & (x <= self.upper)
+        return np.where(inside, self.density(x) / self.total, 0.0)
+
+    def cdf(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        i = np.clip(np.searchsorted(self.x, x, side='right') - 1, 0, self.x.size - 2)
+        x0, x1 = self.x[i], self.x[i + 1]
+        h = x1 - x0
+        t = (x - x0) / h
+        result = _hermite(t, h, self.cdf_values[i], self.cdf_values[i + 1],
+                          self.pdf_values[i], self.pdf_values[i + 1])
+        result = np.clip(result, self.cdf_values[i], self.cdf_values[i + 1])
+        return np.where(x <= self.lower, 0.0, np.where(x >= self.upper, 1.0, result))
+
+    def ppf(self, q):
+        """Quantile function: the `x` with `cdf(x) == q`."""
+        q = np.asarray(q, dtype=np.float64)
+        i = np.searchsorted(self.cdf_values, q, side='right') - 1
+        i = np.clip(i, 0, self.x.size - 2)
+        c0, c1 = self.cdf_values[i], self.cdf_values[i + 1]
+        x0, x1 = self.x[i], self.x[i + 1]
+        h = x1 - x0
+        dc = c1 - c0
+        # Start from linear interpolation and polish with Newton steps on
+        # the same cubic `cdf` uses, so `cdf(ppf(q))` returns `q`
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.clip(np.where(dc > 0, (q - c0) / dc, 0.0), 0, 1)
+            for _ in range(4):
+                value = _hermite(t, h, c0, c1, self.pdf_values[i], self.pdf_values[i + 1])
+                slope = _hermite_slope(t, h, c0, c1, self.pdf_values[i],
+                                       self.pdf_values[i + 1])
+                step = np.where(slope > 0, (value - q) / slope, 0.0)
+                t = np.clip(t - step, 0, 1)
+        result = x0 + t * h
+        result = np.where(q <= 0, self.lower, np.where(q >= 1, self.upper, result))
+        return np.where((q < 0) | (q > 1) | np.isnan(q), np.nan, result)
+
+
+def _hermite(t, h, c0, c1, f0, f1):
+    # Cubic through (0, c0) and (1, c1) with slopes h*f0 and h*f1
+    t2 = t * t
+    t3 = t2 * t
+    return ((2 * t3 - 3 * t2 + 1) * c0 + (t3 - 2 * t2 + t) * h * f0
+            + (-2 * t3 + 3 * t2) * c1 + (t3 - t2) * h * f1)
+
+
+def _hermite_slope(t, h, c0, c1, f0, f1):
+    # Derivative of `_hermite` with respect to t
+    t2 = t * t
+    return ((6 * t2 - 6 * t) * c0 + (3 * t2 - 4 * t + 1) * h * f0
+            + (-6 * t2 + 6 * t) * c1 + (3 * t2 - 2 * t) * h * f1)
+
+
+if __name__ == '__main__':
+    import time
+    from scipy.stats import norm
+
+    # The lesson's handmade standard normal
+    def my_dist(x, myu=0, sigma=1):
+        pf = np.exp(-0.5 * ((x - myu) / sigma) ** 2)
+        return pf / (sigma * ((2 * np.pi) ** (1 / 2)))
+
+    start = time.perf_counter()
+    dist = NumericalDistribution(my_dist)
+    print('grid nodes : %d   build : %.4fs' % (dist.x.size, time.perf_counter() - start))
+
+    x = np.random.default_rng(0).uniform(-6, 6, 10**6)
+    start = time.perf_counter()
+    cdf = dist.cdf(x)
+    print('cdf of 1e6 points : %.4fs   max error : %.2e'
+          % (time.perf_counter() - start, np.abs(cdf - norm.cdf(x)).max()))
+
+    q = np.linspace(0.001, 0.999, 10**6)
+    start = time.perf_counter()
+    ppf = dist.ppf(q)
+    print('ppf of 1e6 points : %.4fs   max error : %.2e'
+          % (time.perf_counter() - start, np.abs(ppf - norm.ppf(q)).max()))
+
+    # A second mode far from 0 is kept in the support
+    mixture = NumericalDistribution(lambda x: 0.5 * norm.pdf(x) + 0.5 * norm.pdf(x, 50))
+    print('mixture support : [%.1f, %.1f]   cdf(10) = %.6f   ppf(0.75) = %.4f'
+          % (mixture.lower, mixture.upper, mixture.cdf(10), mixture.ppf(0.75)))
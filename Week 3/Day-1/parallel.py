@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Run Monte Carlo simulations on all CPU cores, reproducibly.
+
+Sections J.3/J.4 of the lesson draw `np.random.binomial(n, p, s)` once under
+a global `np.random.seed`. Here the `s` samples are split into fixed-size
+chunks, every chunk gets its own stream from `SeedSequence(seed).spawn`, and
+the chunks are run in a process pool. Each chunk returns a partial result
+(a histogram and a moment accumulator) and the partials are merged in chunk
+order.
+
+Because the chunks and their streams only depend on `seed` and
+`chunk_size`, never on the number of workers, the merged result is
+bit-identical whether it runs on 1 core or 64.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+# Number of samples simulated by one task
+DEFAULT_CHUNK = 1 << 20
+
+
+class Moments:
+    """Count, mean and sum of squared deviations, mergeable (Chan et al.)."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_array(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return cls()
+        mean = values.mean()
+        return cls(values.size, float(mean), float(((values - mean) ** 2).sum()))
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        return self
+
+    def var(self, ddof=1):
+        if self.count - ddof <= 0:
+            return float('nan')
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        return self.var(ddof) ** 0.5
+
+
+class SamplePartial:
+    """Partial result of one chunk: a count per integer outcome plus moments."""
+
+    def __init__(self, counts, moments):
+        self.counts = counts
+        self.moments = moments
+
+    def merge(self, other):
+        if other.counts.size > self.counts.size:
+            self.counts, other_counts = other.counts.copy(), self.counts
+        else:
+            other_counts = other.counts
+        self.counts[:other_counts.size] += other_counts
+        self.moments.merge(other.moments)
+        return self
+
+
+def _chunks(n_samples, chunk_size):
+    if n_samples < 0:
+        raise ValueError('n_samples must be non-negative')
+    if chunk_size <= 0:
+        raise ValueError('chunk_size must be positive')
+    full, rest = divmod(int(n_samples), int(chunk_size))
+    return [chunk_size] * full + ([rest] if rest else [])
+
+
+def _run_chunk(simulate, task):
+    seed_seq, size = task
+    return simulate(np.random.default_rng(seed_seq), size)
+
+
+def run_parallel(simulate, n_samples, seed=None, chunk_size=DEFAULT_CHUNK,
+                 workers=None):
+    """Run `simulate(rng, size)` over `n_samples` samples and merge the results.
+
+    `simulate` must be a picklable (module level) function returning an
+    object with a `merge(other)` method, such as `SamplePartial`. `workers`
+    defaults to every core; `workers=1` runs in the current process.
+    """
+    sizes = _chunks(n_samples, chunk_size)
+    if not sizes:
+        raise ValueError('n_samples must be positive')
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+    run = partial(_run_chunk, simulate)
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    if workers == 1:
+        partials = map(run, tasks)
+        return _merge_all(partials)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() keeps the chunk order, so the merge order never changes
+        return _merge_all(pool.map(run, tasks))
+
+
+def _merge_all(partials):
+    partials = iter(partials)
+    result = next(partials)
+    for other in partials:
+        result.merge(other)
+    return result
+
+
+def simulate_binomial(rng, size, n, p, method='random'):
+    """Chunk simulator for `np.random.binomial(n, p, size) / n`.
+
+    With `method='sobol'` or `'halton'` every chunk is a scrambled
+    low-discrepancy sequence mapped through the binomial ppf (see
+    `quasi_random.py`).
+    """
+    if method == 'random':
+        successes = rng.binomial(n, p, size)
+    else:
+        from quasi_random import draw
+        successes = draw('binom', size, method, rng, n=n, p=p)
+    counts = np.bincount(successes, minlength=n + 1).astype(np.int64)
+    return SamplePartial(counts, Moments.from_array(successes / n))
+
+
+def sampling_distribution(n, p, s, seed=None, chunk_size=DEFAULT_CHUNK,
+                          workers=None, method='random'):
+    """Simulated sampling distribution of the proportion `p-hat`.
+
+    Returns a `SamplePartial` whose `counts[k]` is how many samples had `k`
+    successes and whose `moments` hold the mean and spread of `p-hat`.
+    """
+    simulate = partial(simulate_binomial, n=n, p=p, method=method)
+    return run_parallel(simulate, s, seed, chunk_size, workers)
+
+
+if __name__ == '__main__':
+    import time
+
+    n, p, s = 100, 0.25, 10**7
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        result = sampling_distribution(n, p, s, seed=42, workers=workers)
+        elapsed = time.perf_counter() - start
+        m, sd = result.moments.mean, result.moments.std()
+        print('workers : %3d   time : %7.3fs' % (workers, elapsed))
+        print('Mean : ', m)
+        print('Minimum Search : ', m - (sd * 2))
+        print('Maximum Search : ', m + (sd * 2))
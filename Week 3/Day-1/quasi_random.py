@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Quasi-Monte Carlo (Sobol / Halton) sampling for the lesson's distributions.
+
+Plain pseudo-random sampling has an error that shrinks like 1/sqrt(N).
+Low-discrepancy sequences fill [0, 1) much more evenly, so averages over
+them converge close to 1/N. Here scrambled Sobol and Halton points from
+`scipy.stats.qmc` are mapped through each distribution's `ppf`
+(inverse-CDF) to get normal, gamma, binomial and Poisson samples.
+Scrambling keeps every sequence random, so independent replicates still
+give an honest error estimate.
+
+    >>> draw('norm', 2**14, method='sobol', seed=0)
+    >>> draw('binom', 2**14, method='halton', n=100, p=0.25)
+
+`method='random'` gives ordinary pseudo-random uniforms, so the same call
+works for both kinds of sampling; `parallel.sampling_distribution` accepts
+the same `method` argument.
+"""
+
+import warnings
+
+import numpy as np
+from scipy import stats
+from scipy.stats import qmc
+
+from distribution_tables import TableService
+from montecarlo import get_rng
+
+METHODS = ('random', 'sobol', 'halton')
+
+# Binomial and Poisson ppf lookups are served from cached tables
+_tables = TableService(maxsize=64)
+
+
+def _make_engine(method, d, scramble, rng):
+    engine = {'sobol': qmc.Sobol, 'halton': qmc.Halton}[method]
+    try:
+        return engine(d, scramble=scramble, rng=rng)
+    except TypeError:
+        # scipy < 1.15 calls the argument `seed`
+        return engine(d, scramble=scramble, seed=rng)
+
+
+def uniform_points(size, d=1, method='sobol', scramble=True, seed=None):
+    """`size` points in [0, 1)^d, as an array of shape (size, d)."""
+    if method not in METHODS:
+        raise ValueError('method must be one of %s' % (METHODS,))
+    rng = get_rng(seed)
+    if method == 'random':
+        return rng.random((size, d))
+    engine = _make_engine(method, d, scramble, rng)
+    with warnings.catch_warnings():
+        # Sobol prefers powers of two but works for any size
+        warnings.simplefilter('ignore', UserWarning)
+        points = engine.random(size)
+    # Keep clear of 0 and 1, where ppf is infinite
+    return np.clip(points, np.finfo(float).tiny, 1 - np.finfo(float).epsneg)
+
+
+def ppf(distribution, u, **params):
+    """Map uniforms `u` through the inverse CDF of `distribution`."""
+    if distribution == 'norm':
+        return stats.norm.ppf(u, params.get('loc', 0), params.get('scale', 1))
+    if distribution == 'gamma':
+        return stats.gamma.ppf(u, params['a'], params.get('loc', 0), params.get('scale', 1))
+    if distribution == 'binom':
+        return _tables.ppf('binom', u, n=params['n'], p=params['p']).astype(np.int64)
+    if distribution == 'poisson':
+        return _tables.ppf('poisson', u, mu=params['mu']).astype(np.int64)
+    raise ValueError("distribution must be 'norm', 'gamma', 'binom' or 'poisson'")
+
+
+def draw(distribution, size, method='sobol', seed=None, **params):
+    """`size` samples of `distribution` using `method` uniforms."""
+    u = uniform_points(size, 1, method, seed=seed)[:, 0]
+    return ppf(distribution, u, **params)
+
+
+def rmse(distribution, size, method, replicates=64, seed=0, statistic=np.mean, **params):
+    """Root-mean-square error of `statistic` over independent replicates."""
+    truth = {'norm': lambda: params.get('loc', 0),
+             'gamma': lambda: stats.gamma.mean(params['a'], params.get('loc', 0),
+                                               params.get('scale', 1)),
+             'binom': lambda: params['n'] * params['p'],
+             'poisson': lambda: params['mu']}[distribution]()
+    seeds = np.random.SeedSequence(seed).spawn(replicates)
+    estimates = np.array([statistic(draw(distribution, size, method, np.random.default_rng(s),
+                                         **params))
+                          for s in seeds])
+    return float(np.sqrt(((estimates - truth) ** 2).mean()))
+
+
+def benchmark(target=5e-3, max_power=18, replicates=32):
+    """Smallest power-of-two sample size reaching `target` RMSE on the mean."""
+    cases = [('norm', {}), ('gamma', {'a': 5}),
+             ('binom', {'n': 100, 'p': 0.25}), ('poisson', {'mu': 3})]
+    print('samples needed for RMSE <= %g on the mean' % target)
+    for name, params in cases:
+        needed = {}
+        for method in METHODS:
+            needed[method] = None
+            for power in range(6, max_power + 1):
+                if rmse(name, 2 ** power, method, replicates, **params) <= target:
+                    needed[method] = 2 ** power
+                    break
+        print('%-8s ' % name + '   '.join('%s: %s' % (m, needed[m] or '> 2**%d' % max_power)
+                                         for m in METHODS))
+
+
+if __name__ == '__main__':
+    print(draw('norm', 8, seed=0))
+    print(draw('poisson', 8, method='halton', seed=0, mu=3))
+    benchmark()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Exact probabilities of runs ("k in a row") in Bernoulli trials.
+
+The lesson's "three heads in a row" only handles exactly three tosses, by
+multiplying 0.5 three times or by simulation. Here a streak question over
+`n` trials is a small Markov chain on "length of the current run":
+
+* state `j < k` : the last `j` trials were successes,
+* state `k`     : a run of `k` has happened (absorbing).
+
+`P(at least one run of k in n trials)` is the absorbing mass after `n`
+steps, computed as `e0 @ T**n` by repeated squaring: O(k**3 log n) instead
+of O(n * k), so n in the millions costs the same as n = 100. Queries are
+vectorized: `n`, `k` and `p` broadcast against each other and every query
+sharing a run length is processed in the same batched matrix products.
+The matrices are (k+1) x (k+1), so this is meant for run lengths up to a
+few hundred. `longest_run_distribution` needs every run length at once
+and switches to an O(n) recurrence run for all of them together when
+the matrix powers would cost more.
+
+    >>> prob_run(n=3, k=3, p=0.5)             # 0.125
+    >>> prob_run(n=10**6, k=[10, 20, 30], p=0.5)
+    >>> longest_run_distribution(n=100, p=0.5)
+"""
+
+import numpy as np
+
+from montecarlo import get_rng
+
+# Cost, in multiply-adds, charged per Python-level step of the recurrence
+RECURRENCE_STEP_COST = 20000
+
+
+def _transfer_matrices(k, p):
+    # One (k+1 x k+1) transition matrix per query; the last state absorbs
+    T = np.zeros((p.size, k + 1, k + 1))
+    for j in range(k):
+        T[:, j, 0] = 1 - p
+        T[:, j, j + 1] = p
+    T[:, k, k] = 1.0
+    return T
+
+
+def _chain_power(n, k, p):
+    # e0 @ T**n by repeated squaring, for queries sharing the run length k
+    M = _transfer_matrices(k, p)
+    v = np.zeros((p.size, k + 1))
+    v[:, 0] = 1.0
+    left = n.copy()
+    while (left > 0).any():
+        odd = (left & 1).astype(bool)
+        if odd.any():
+            v[odd] = np.einsum('qi,qij->qj', v[odd], M[odd])
+        left >>= 1
+        if (left > 0).any():
+            M = np.matmul(M, M)
+    return v[:, -1], v[:, :-1].sum(axis=1)
+
+
+def run_probabilities(n, k, p):
+    """Return `(P(run of k), P(no run of k))` for every broadcast query."""
+    n, k, p = np.broadcast_arrays(np.asarray(n, dtype=np.int64),
+                                  np.asarray(k, dtype=np.int64),
+                                  np.asarray(p, dtype=np.float64))
+    shape = n.shape
+    n, k, p = n.ravel(), k.ravel(), p.ravel()
+    if (n < 0).any() or (k < 1).any() or ((p < 0) | (p > 1)).any():
+        raise ValueError('need n >= 0, k >= 1 and 0 <= p <= 1')
+    # Runs longer than n can never happen, so cap k at n + 1
+    k = np.minimum(k, n + 1)
+    # p = 0 never has a run and p = 1 has one as soon as n >= k
+    run = np.where(p == 1, (n >= k).astype(np.float64), 0.0)
+    none = 1 - run
+    chain = (p > 0) & (p < 1)
+    # Queries with the same k share a matrix size, so no query is padded
+    for size in np.unique(k[chain]):
+        group = np.flatnonzero(chain & (k == size))
+        run[group], none[group] = _chain_power(n[group], int(size), p[group])
+    return run.reshape(shape), none.reshape(shape)
+
+
+def prob_run(n, k, p=0.5):
+    """P(at least one run of `k` successes in `n` Bernoulli(`p`) trials)."""
+    return run_probabilities(n, k, p)[0]
+
+
+def prob_no_run(n, k, p=0.5):
+    """P(no run of `k` successes in `n` trials).
+
+    Computed directly rather than as `1 - prob_run`, so it keeps its
+    relative precision when small (down to float64 underflow).
+    """
+    return run_probabilities(n, k, p)[1]
+
+
+def _run_recurrence(n, r, p):
+    # `(P(run of r), P(no run of r))` in n trials for every r in the array
+    # `r`, from q[m] = q[m-1] - (1-p) p**r q[m-r-1] on q = P(no run),
+    # started from q[0] = 1, q[-1] = 1 / (1-p) and q[j] = 0 below. The
+    # next r_min + 1 values only depend on known ones, so they come from
+    # one cumulative sum, and each r keeps a ring buffer of its recent
+    # values. Accurate in absolute terms, to about n * eps times the value
+    # tracked, so r unlikely to have a run tracks u = 1 - q instead
+    count = r.size
+    c = (1 - p) * p ** r
+    # About exp(-n c) is P(no run); track whichever side is smaller
+    complement = n * c < np.log(2)
+    block = int(r.min()) + 1
+    length = int(r.max()) + block + 1
+    # history[j % length, i] holds q[j] (or u[j]) for the i-th r
+    history = np.zeros((length, count))
+    history[0] = 1.0
+    history[-1] = 1 / (1 - p)
+    history[:] = np.where(complement, 1 - history, history)
+    flat = history.reshape(-1)
+    lags = np.arange(block)[:, None] - r
+    columns = np.arange(count)
+    # u[m] = u[m-1] + c (1 - u[m-r-1]), the same update on needed - 1
+    shift = complement.astype(np.float64)
+    last = history[0].copy()
+    m = 0
+    while m < n:
+        b = min(block, n - m)
+        needed = flat.take((m + lags[:b]) % length * count + columns)
+        values = last - c * np.cumsum(needed - shift, axis=0)
+        history[(m + 1 + np.arange(b)) % length] = values
+        last = values[-1]
+        m += b
+    last = np.clip(last, 0, 1)
+    return np.where(complement, last, 1 - last), np.where(complement, 1 - last, last)
+
+
+def longest_run_distribution(n, p=0.5, tail=1e-17):
+    """Distribution of the longest run of successes in `n` trials.
+
+    Returns `probs` with `probs[r] = P(longest run == r)`, for `r` up to
+    the length where `P(longest run >= r)` is below `tail` (by the union
+    bound `n * p**r`). Lengths whose `P(longest run < r)` is below `tail`
+    get probability 0 without being computed.
+
+    All lengths come from one pass: matrix powers, one per length, while
+    they are cheap, otherwise the O(n) recurrence run for every length at
+    once.
+    """
+    n = int(n)
+    if n < 0 or not 0 <= p <= 1:
+        raise ValueError('need n >= 0 and 0 <= p <= 1')
+    if p == 0 or p == 1 or n == 0:
+        probs = np.zeros((n if p == 1 else 0) + 1)
+        probs[-1] = 1.0
+        return probs
+    top = int(np.ceil(np.log(tail / n) / np.log(p)))
+    top = min(n, max(top, 1))
+    r = np.arange(1, top + 2)
+    # P(no run of r) <= (1 - (1-p) p**r) ** (n // (r+1)), from disjoint
+    # blocks of a failure followed by r successes
+    with np.errstate(divide='ignore'):
+        bound = n // (r + 1) * np.log1p(-(1 - p) * p ** r)
+    r = r[bound >= np.log(tail)]
+    # P(longest < r) = P(no run of r) = 1 - P(run of r)
+    run, none = np.ones(top + 1), np.zeros(top + 1)
+    matrix_cost = np.sum((r + 1.0) ** 3) * np.log2(n + 1)
+    recurrence_cost = n * (r.size + RECURRENCE_STEP_COST / (r[0] + 1))
+    if matrix_cost <= recurrence_cost:
+        run[r - 1], none[r - 1] = run_probabilities(n, r, p)
+    else:
+        run[r - 1], none[r - 1] = _run_recurrence(n, r, p)
+    # Difference whichever side is small, to keep the tails' precision
+    probs = np.concatenate([none[:1], np.where(run[:-1] <= 0.5, run[:-1] - run[1:],
+                                               none[1:] - none[:-1])])
+    return np.clip(probs, 0, None)
+
+
+def simulate_run_probability(n, k, p=0.5, trials=10**5, rng=None):
+    """Monte Carlo estimate of `prob_run`, for cross-checking small `n`."""
+    rng = get_rng(rng)
+    success = rng.random((trials, n)) < p
+    run = np.zeros(trials, dtype=np.int64)
+    hit = np.zeros(trials, dtype=bool)
+    for t in range(n):
+        run = np.where(success[:, t], run + 1, 0)
+        hit |= run >= k
+    return hit.mean()
+
+
+if __name__ == '__main__':
+    import time
+
+    print('three heads in three tosses : ', prob_run(3, 3, 0.5))
+    print('three heads in ten tosses   : ', prob_run(10, 3, 0.5),
+          ' simulated : ', simulate_run_probability(10, 3, 0.5, rng=0))
+
+    start = time.perf_counter()
+    n = np.array([10**3, 10**6, 10**6, 10**9])
+    k = np.array([10, 20, 25, 30])
+    print('P(run) : ', prob_run(n, k, 0.5), ' (%.4fs)' % (time.perf_counter() - start))
+
+    # 99.9% availability SLA: chance of 5 failed checks in a row over a year
+    # of per-minute checks
+    print('SLA streak : ', prob_run(525600, 5, 0.001))
+
+    start = time.perf_counter()
+    probs = longest_run_distribution(10**6, 0.5)
+    mode = int(np.argmax(probs))
+    print('longest run in 1e6 tosses : mode %d, P(mode) %.4f, total %.6f  (%.4fs)'
+          % (mode, probs[mode], probs.sum(), time.perf_counter() - start))
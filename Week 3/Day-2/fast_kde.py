@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Binned FFT kernel density estimate, a fast stand-in for `stats.gaussian_kde`.
+
+The lesson draws every density line with `stats.gaussian_kde(data)`
+evaluated at the histogram bin edges. That sums one Gaussian per data
+point for every evaluation point, O(n * m) per call. `BinnedKDE` does
+what large-data KDE tools do instead:
+
+1. linear binning: every point splits its weight between the two nearest
+   nodes of a regular grid (one `np.bincount` per chunk),
+2. the binned counts are convolved with the Gaussian kernel by FFT,
+3. the density on the grid is cached, and calls interpolate on it.
+
+The cost is O(n + g log g) for a grid of g nodes, and calls after the
+first are just `np.interp`. Bandwidths:
+
+* `'scott'`, `'silverman'` or a number: the same factors as
+  `gaussian_kde`, times the sample standard deviation,
+* `'isj'`: the Improved Sheather-Jones plug-in of Botev et al. (2010),
+  which also works for skewed and multimodal data such as the salaries.
+
+    >>> density = BinnedKDE(salary)
+    >>> n, x, _ = plt.hist(salary, histtype='step', bins=25)
+    >>> plt.plot(x, density(x))
+"""
+
+import numpy as np
+from scipy import fft, optimize, signal
+
+# Grid nodes; a power of two keeps the FFT fast
+DEFAULT_GRIDSIZE = 1 << 12
+
+# The grid reaches this many bandwidths past the data, like seaborn's `cut`
+DEFAULT_CUT = 3
+
+# Points binned at once, to bound memory
+DEFAULT_CHUNK = 1 << 22
+
+# Grid used to estimate the ISJ bandwidth
+_ISJ_GRIDSIZE = 1 << 14
+
+
+def linear_binning(data, lo, hi, gridsize, weights=None, chunk_size=DEFAULT_CHUNK):
+    """Weight of `data` on `gridsize` equally spaced nodes from `lo` to `hi`."""
+    data = np.asarray(data, dtype=np.float64)
+    counts = np.zeros(gridsize)
+    dx = (hi - lo) / (gridsize - 1)
+    for begin in range(0, data.size, chunk_size):
+        t = (data[begin:begin + chunk_size] - lo) / dx
+        w = 1.0 if weights is None else weights[begin:begin + chunk_size]
+        left = np.clip(np.floor(t), 0, gridsize - 2).astype(np.int64)
+        share = np.clip(t - left, 0, 1)
+        counts += np.bincount(left, (1 - share) * w, minlength=gridsize)
+        counts += np.bincount(left + 1, share * w, minlength=gridsize)
+    return counts
+
+
+def _isj_fixed_point(t, n, i_sq, a2):
+    # t - xi * gamma^[l](t) from Botev et al. (2010), with l = 7
+    ell = 7
+    f = 2 * np.pi ** (2 * ell) * np.sum(i_sq ** ell * a2 * np.exp(-i_sq * np.pi ** 2 * t))
+    for s in range(ell - 1, 1, -1):
+        k0 = np.prod(np.arange(1, 2 * s, 2)) / np.sqrt(2 * np.pi)
+        const = (1 + 0.5 ** (s + 0.5)) / 3
+        time = (2 * const * k0 / (n * f)) ** (2 / (3 + 2 * s))
+        f = 2 * np.pi ** (2 * s) * np.sum(i_sq ** s * a2 * np.exp(-i_sq * np.pi ** 2 * time))
+    return t - (2 * n * np.sqrt(np.pi) * f) ** (-2 / 5)
+
+
+def isj_bandwidth(data, weights=None):
+    """Improved Sheather-Jones plug-in bandwidth (Botev et al., 2010)."""
+    data = np.asarray(data, dtype=np.float64)
+    lo, hi = data.min(), data.max()
+    span = hi - lo
+    if span == 0:
+        raise ValueError('ISJ needs data with more than one distinct value')
+    lo, hi = lo - span / 10, hi + span / 10
+    counts = linear_binning(data, lo, hi, _ISJ_GRIDSIZE, weights)
+    n = data.size if weights is None else weights.sum() ** 2 / (weights ** 2).sum()
+    a = fft.dct(counts / counts.sum(), type=2)
+    i_sq = np.arange(1, _ISJ_GRIDSIZE, dtype=np.float64) ** 2
+    a2 = a[1:] ** 2 / 4
+    # Widen the search until the fixed point is bracketed
+    upper = 0.01
+    while _isj_fixed_point(upper, n, i_sq, a2) < 0 and upper < 1:
+        upper *= 2
+    t = optimize.brentq(_isj_fixed_point, 0, upper, args=(n, i_sq, a2))
+    return np.sqrt(t) * (hi - lo)
+
+
+class BinnedKDE:
+    """Gaussian KDE of 1-D data on a cached FFT grid; call it like `gaussian_kde`."""
+
+    def __init__(self, dataset, bw_method='scott', weights=None,
+                 gridsize=DEFAULT_GRIDSIZE, cut=DEFAULT_CUT):
+        data = np.asarray(dataset, dtype=np.float64).ravel()
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64).ravel()
+            if weights.shape != data.shape:
+                raise ValueError('weights must have the same length as the data')
+            weights = weights / weights.sum()
+        if data.size < 2:
+            raise ValueError('need at least two data points')
+        self.n = data.size
+        self.neff = self.n if weights is None else 1 / (weights ** 2).sum()
+
+        if weights is None:
+            mean = data.mean()
+            std = np.sqrt(((data - mean) ** 2).sum() / (self.n - 1))
+        else:
+            mean = (weights * data).sum()
+            std = np.sqrt((weights * (data - mean) ** 2).sum() / (1 - (weights ** 2).sum()))
+        if bw_method == 'scott':
+            self.factor = self.neff ** (-1 / 5)
+        elif bw_method == 'silverman':
+            self.factor = (self.neff * 3 / 4) ** (-1 / 5)
+        elif bw_method == 'isj':
+            self.factor = isj_bandwidth(data, weights) / std
+        elif np.isscalar(bw_method):
+            self.factor = float(bw_method)
+        else:
+            raise ValueError("bw_method must be 'scott', 'silverman', 'isj' or a number")
+        self.bandwidth = self.factor * std
+        if not self.bandwidth > 0:
+            raise ValueError('bandwidth is zero; is the data constant?')
+
+        lo = data.min() - cut * self.bandwidth
+        hi = data.max() + cut * self.bandwidth
+        self.grid = np.linspace(lo, hi, gridsize)
+        dx = self.grid[1] - self.grid[0]
+        counts = linear_binning(data, lo, hi, gridsize, weights)
+        counts /= counts.sum()
+        # Kernel sampled on the grid spacing, cut off at 5 bandwidths
+        reach = min(gridsize - 1, int(np.ceil(5 * self.bandwidth / dx)))
+        offsets = np.arange(-reach, reach + 1) * dx / self.bandwidth
+        kernel = np.exp(-0.5 * offsets ** 2) / (np.sqrt(2 * np.pi) * self.bandwidth)
+        self.density = np.clip(signal.fftconvolve(counts, kernel, mode='same'), 0, None)
+
+    def evaluate(self, points):
+        """Density at `points`, interpolated on the cached grid."""
+        points = np.asarray(points, dtype=np.float64)
+        return np.interp(points, self.grid, self.density, left=0.0, right=0.0)
+
+    __call__ = evaluate
+    pdf = evaluate
+
+    def integrate_box_1d(self, low, high):
+        """Probability mass between `low` and `high`."""
+        cdf = np.concatenate([[0.0], np.cumsum((self.density[1:] + self.density[:-1]) / 2)])
+        cdf *= self.grid[1] - self.grid[0]
+        return float(np.diff(np.interp([low, high], self.grid, cdf))[0])
+
+
+if __name__ == '__main__':
+    import time
+
+    from scipy import stats
+
+    # The lesson's salaries, with Rosie's 189,000
+    salary = np.array([50000, 54000, 50000, 189000, 55000, 40000, 59000])
+    edges = np.histogram_bin_edges(salary, bins=25)
+    print('salary, max gap to gaussian_kde : %.2e (density peak %.2e)'
+          % (np.abs(BinnedKDE(salary)(edges) - stats.gaussian_kde(salary)(edges)).max(),
+             stats.gaussian_kde(salary)(edges).max()))
+
+    rng = np.random.default_rng(0)
+    for method in ('scott', 'silverman', 'isj'):
+        print('%-9s bandwidth, 1e5 normal points : %.4f'
+              % (method, BinnedKDE(rng.standard_normal(10**5), method).bandwidth))
+
+    data = rng.standard_normal(10**7)
+    edges = np.histogram_bin_edges(data, bins=100)
+    start = time.perf_counter()
+    density = BinnedKDE(data)
+    fitted = time.perf_counter() - start
+    start = time.perf_counter()
+    values = density(edges)
+    called = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = stats.gaussian_kde(data)(edges)
+    scipy_time = time.perf_counter() - start
+    print('n = 1e7, 101 points : binned %.2fs (+ %.1e s per call)   gaussian_kde %.1fs'
+          % (fitted, called, scipy_time))
+    print('max relative gap : %.1e' % np.max(np.abs(values - exact) / exact))
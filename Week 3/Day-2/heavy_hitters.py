@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Approximate modes and top-k values of unbounded streams, in fixed memory.
+
+`df['Salary'].mode()` needs the whole column and a count of every
+distinct value. Two mergeable summaries do it in fixed memory instead:
+
+* `SpaceSaving(capacity)` keeps at most `capacity` values with a count
+  and an over-estimation bound each (Metwally et al., 2005). A value seen
+  more than n / capacity times is always kept, and every kept count is at
+  most n / capacity too high. Batches are counted with `value_counts` and
+  merged in as summaries, as in Agarwal et al., "Mergeable summaries".
+  `mode()` and `value_counts(k)` return Series shaped like pandas'.
+* `CountMin(width, depth)` answers "how often did x occur" for any value,
+  over-estimating by at most e * n / width with probability
+  1 - exp(-depth) (Cormode and Muthukrishnan, 2005).
+
+While a `SpaceSaving` summary has never been full, its counts are exact.
+
+    >>> top = SpaceSaving(1000)
+    >>> for batch in pd.read_csv('salaries.csv', chunksize=10**6):
+    ...     top.update(batch['Salary'])
+    >>> top.mode()
+    >>> top.value_counts(10)
+"""
+
+import numpy as np
+import pandas as pd
+
+from profiler import hash_values
+
+DEFAULT_CAPACITY = 1000
+
+# Hash keys (16 characters) for the rows of a CountMin sketch
+_HASH_KEYS = tuple('countminrow%05d' % i for i in range(32))
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters summary; `update` with batches, `merge`."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, name=None):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = int(capacity)
+        self.name = name
+        self.n = 0
+        self.counts = pd.Series(dtype=np.int64)
+        self.errors = pd.Series(dtype=np.int64)
+        # Set when `counts` holds every value seen, whatever its length
+        self._exact = False
+
+    def _floor(self):
+        # Count any value missing from a full summary may have had
+        if self._exact or len(self.counts) < self.capacity:
+            return 0
+        return int(self.counts.min())
+
+    def update(self, batch):
+        """Add a batch of values (an array or Series; nulls are skipped)."""
+        batch = batch if isinstance(batch, pd.Series) else pd.Series(np.asarray(batch))
+        if self.name is None:
+            self.name = batch.name
+        counts = batch.value_counts(dropna=True, sort=False)
+        exact = SpaceSaving(self.capacity, self.name)
+        exact.n = int(counts.sum())
+        exact.counts = counts.astype(np.int64).rename(None)
+        exact.errors = pd.Series(0, index=counts.index, dtype=np.int64)
+        exact._exact = True
+        merged = self.merge(exact)
+        self.n, self.counts, self.errors = merged.n, merged.counts, merged.errors
+        return self
+
+    def merge(self, other):
+        """A new summary of both inputs (same guarantee, same capacity)."""
+        capacity = min(self.capacity, other.capacity)
+        floor_a, floor_b = self._floor(), other._floor()
+        index = self.counts.index.union(other.counts.index)
+        # A value missing from a summary gets that summary's floor
+        counts = (self.counts.reindex(index).fillna(floor_a)
+                  + other.counts.reindex(index).fillna(floor_b))
+        errors = (self.errors.reindex(index).fillna(floor_a)
+                  + other.errors.reindex(index).fillna(floor_b))
+        keep = counts.nlargest(capacity, keep='first').index
+        result = SpaceSaving(capacity, self.name if self.name is not None else other.name)
+        result.n = self.n + other.n
+        result.counts = counts[keep].astype(np.int64)
+        result.errors = errors[keep].astype(np.int64)
+        return result
+
+    def value_counts(self, k=None):
+        """The `k` most frequent values, like `value_counts().head(k)`."""
+        result = self.counts.sort_values(ascending=False, kind='stable')
+        if k is not None:
+            result = result.head(k)
+        result = result.rename('count')
+        result.index.name = self.name
+        return result
+
+    def bounds(self, k=None):
+        """Top `k` with the estimated count and a guaranteed lower bound."""
+        top = self.value_counts(k)
+        return pd.DataFrame({'count': top, 'lower': top - self.errors[top.index]})
+
+    def mode(self):
+        """Values with the highest count, sorted, like `Series.mode()`."""
+        if self.counts.empty:
+            return pd.Series([], name=self.name, dtype=object)
+        best = self.counts[self.counts == self.counts.max()].index
+        return pd.Series(np.sort(best.to_numpy()), name=self.name)
+
+
+class CountMin:
+    """Count-Min sketch: over-estimated frequency of any value, mergeable."""
+
+    def __init__(self, width=1 << 16, depth=5):
+        if not 1 <= depth <= len(_HASH_KEYS):
+            raise ValueError('depth must be between 1 and %d' % len(_HASH_KEYS))
+        self.width = int(width)
+        self.depth = int(depth)
+        self.n = 0
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def _columns(self, values):
+        # Equal numbers share cells whatever their dtype (see `hash_values`)
+        return [(hash_values(values, hash_key=key) % np.uint64(self.width)).astype(np.int64)
+                for key in _HASH_KEYS[:self.depth]]
+
+    def update(self, batch):
+        """Add a batch of values (nulls are skipped)."""
+        counts = pd.Series(batch).value_counts(dropna=True, sort=False)
+        self.n += int(counts.sum())
+        weights = counts.to_numpy(dtype=np.float64)
+        for row, column in enumerate(self._columns(counts.index)):
+            self.table[row] += np.bincount(column, weights, minlength=self.width).astype(np.int64)
+        return self
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('can only merge sketches of the same shape')
+        result = CountMin(self.width, self.depth)
+        result.n = self.n + other.n
+        result.table = self.table + other.table
+        return result
+
+    def estimate(self, values):
+        """Estimated count of every value in `values` (never too low)."""
+        columns = self._columns(pd.Series(values))
+        return np.min([self.table[row, column] for row, column in enumerate(columns)], axis=0)
+
+    def error_bound(self):
+        """Over-estimate that holds with probability 1 - exp(-depth)."""
+        return np.e * self.n / self.width
+
+
+if __name__ == '__main__':
+    import time
+
+    df = pd.DataFrame({'Name': ['Dan', 'Joann', 'Pedro', 'Rosie', 'Ethan', 'Vicky', 'Frederic'],
+                       'Salary': [50000, 54000, 50000, 189000, 55000, 40000, 59000]})
+    top = SpaceSaving(100).update(df['Salary'])
+    print(top.mode())
+    print(df['Salary'].mode())
+
+    # Zipf-distributed stream in batches, two workers' summaries merged
+    rng = np.random.default_rng(0)
+    parts = [SpaceSaving(1000, name='item') for _ in range(2)]
+    sketch = CountMin()
+    batches = [pd.Series(rng.zipf(1.3, 10**6), name='item') for _ in range(20)]
+    start = time.perf_counter()
+    for i, batch in enumerate(batches):
+        parts[i % 2].update(batch)
+        sketch.update(batch)
+    top = parts[0].merge(parts[1])
+    elapsed = time.perf_counter() - start
+    exact = pd.concat(batches).value_counts()
+    print('2e7 values : %.2fs, %d counters' % (elapsed, len(top.counts)))
+    print(pd.DataFrame({'space-saving': top.value_counts(5), 'exact': exact.head(5),
+                        'count-min': sketch.estimate(exact.head(5).index)}))
+    print('mode : sketch %s   exact %s' % (top.mode().tolist(), exact.index[:1].tolist()))
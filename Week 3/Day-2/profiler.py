@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""One-pass column profiles: nulls, dtype, distinct counts and moments.
+
+The EDA part of the lesson loops over `columns_num` calling
+`df_train[col].isnull().sum()`, before and after imputing, next to
+separate `describe()`, `.skew()` and `.hist()` calls. `TableProfile`
+collects everything in one pass over chunks of the table:
+
+* nulls and non-null count per column, and the dtype,
+* distinct values, estimated with a `HyperLogLog` sketch (standard error
+  1.04 / sqrt(2**precision), 0.8% for the default precision 14, in 16 KB
+  per column whatever the number of rows),
+* min, max, mean, std and skew of the numeric columns, from a
+  `RunningStats` accumulator (see `running_stats.py`).
+
+Within a chunk the columns are hashed in a thread pool; profiles of
+separate chunks or files merge, so `profile_files` can spread a large
+table's files over processes. `report()` is a DataFrame with one row per
+column.
+
+    >>> profile(pd.read_csv('train.csv', chunksize=10**5)).report()
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial, reduce
+
+import numpy as np
+import pandas as pd
+
+from running_stats import RunningStats
+
+HLL_PRECISION = 14
+
+# Attributes of a RunningStats accumulator, one entry per column
+_MOMENTS = ('count', 'mean', 'm2', 'm3', 'm4', 'min', 'max')
+
+# HyperLogLog bias correction for small register counts (Flajolet et al.)
+_ALPHA = {16: 0.673, 32: 0.697, 64: 0.709}
+
+REPORT_COLUMNS = ('dtype', 'count', 'nulls', 'null_pct', 'distinct',
+                  'min', 'max', 'mean', 'std', 'skew')
+
+# pandas' default key for `hash_array`
+HASH_KEY = '0123456789123456'
+
+
+def _seed(hash_key, domain):
+    # uint64 seed for hashing numbers of one domain under `hash_key`
+    return pd.util.hash_array(np.array([hash_key + domain], dtype=object))[0]
+
+
+def _mix(bits, seed):
+    # splitmix64 finalizer of the 64-bit patterns `bits` xor `seed`;
+    # `hash_array` ignores `hash_key` for numbers, so numbers are keyed here
+    x = bits ^ seed
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def hash_values(values, hash_key=HASH_KEY):
+    """uint64 hash of every value; equal numbers get equal hashes.
+
+    `pd.util.hash_array` hashes int 1950 and float 1950.0 differently, and
+    `read_csv` gives an int column float64 dtype in the chunks where it has
+    a NaN. Integers, and floats that are whole numbers in the int64 range
+    (-0.0 included), are therefore hashed as int64, so every int64 value
+    keeps a hash of its own; other floats are hashed by their float64 bits,
+    with a separate seed. Different `hash_key`s give independent hashes.
+    """
+    if not isinstance(values, (pd.Series, pd.Index)):
+        values = pd.Series(np.asarray(values))
+    kind = values.dtype.kind
+    if kind not in 'iuf':
+        return pd.util.hash_array(values.to_numpy(), hash_key=hash_key)
+    if kind in 'iu' and not values.hasnans:
+        values = values.to_numpy()
+        hashes = _mix(values.astype(np.int64).view(np.uint64), _seed(hash_key, 'int'))
+        if kind == 'u':
+            # Above 2**63 the bits are those of a negative int64
+            big = values > np.iinfo(np.int64).max
+            hashes[big] = _mix(values[big].astype(np.uint64), _seed(hash_key, 'uint'))
+        return hashes
+    values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(invalid='ignore'):
+        whole = (values == np.floor(values)) & (np.abs(values) < 2.0 ** 63)
+    hashes = np.empty(values.size, dtype=np.uint64)
+    hashes[whole] = _mix(values[whole].astype(np.int64).view(np.uint64), _seed(hash_key, 'int'))
+    hashes[~whole] = _mix(values[~whole].view(np.uint64), _seed(hash_key, 'float'))
+    return hashes
+
+
+def _common_dtype(a, b):
+    # int64 in one chunk and float64 (with NaN) in another is still numeric
+    if a == b or 'mixed' in (a, b):
+        return a if a == b else 'mixed'
+    kinds = pd.api.types.pandas_dtype(a).kind + pd.api.types.pandas_dtype(b).kind
+    if set(kinds) <= set('iu'):
+        return 'int64'
+    if set(kinds) <= set('iuf'):
+        return 'float64'
+    return 'mixed'
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 64-bit hashes (Flajolet et al., 2007)."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18')
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        """Add the non-null values of an array or Series."""
+        values = pd.Series(values) if not isinstance(values, pd.Series) else values
+        values = values[values.notna()]
+        if values.size:
+            self.update_hashes(hash_values(values))
+        return self
+
+    def update_hashes(self, hashes):
+        """Add precomputed uint64 hashes."""
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Position of the leftmost 1 in the remaining 64 - p bits. frexp
+        # is exact on at most 53 bits, so longer values drop their low
+        # bits first; those below 2**shift are short enough as they are
+        shift = max(0, 64 - p - 53)
+        high = rest >> np.uint64(shift)
+        bit_length = np.where(high > 0, np.frexp(high.astype(np.float64))[1] + shift,
+                              np.frexp(rest.astype(np.float64))[1])
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('can only merge sketches with the same precision')
+        result = HyperLogLog(self.precision)
+        result.registers = np.maximum(self.registers, other.registers)
+        return result
+
+    def count(self):
+        """Estimated number of distinct values."""
+        m = self.registers.size
+        # Bias correction; the formula only holds from m = 128 on
+        alpha = _ALPHA.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range: linear counting is more accurate
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+
+def _reindexed(stats, columns):
+    # The same accumulator over `columns`; columns it has not seen are empty
+    if stats.columns == columns:
+        return stats
+    result = RunningStats(columns)
+    result._reset(len(columns))
+    for position, column in enumerate(stats.columns):
+        target = columns.index(column)
+        for name in _MOMENTS:
+            getattr(result, name)[target] = getattr(stats, name)[position]
+    return result
+
+
+class TableProfile:
+    """Mergeable per-column profile of a table read in chunks."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.columns = []
+        self.dtypes = {}
+        self.rows = 0
+        self.nulls = {}
+        self.sketches = {}
+        self.numeric = []
+        self.stats = None
+
+    def _add_columns(self, chunk):
+        for column in chunk.columns:
+            if column not in self.dtypes:
+                self.columns.append(column)
+                self.dtypes[column] = str(chunk[column].dtype)
+                # Null in every earlier row
+                self.nulls[column] = self.rows
+                self.sketches[column] = HyperLogLog(self.precision)
+                if pd.api.types.is_numeric_dtype(chunk[column]):
+                    self.numeric.append(column)
+            else:
+                self.dtypes[column] = _common_dtype(self.dtypes[column], str(chunk[column].dtype))
+
+    def _numeric_block(self, chunk):
+        block = {}
+        for column in self.numeric:
+            values = chunk[column] if column in chunk else pd.Series(np.nan, index=chunk.index)
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors='coerce')
+            block[column] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        return pd.DataFrame(block, columns=self.numeric)
+
+    def update(self, chunk, workers=1):
+        """Profile a chunk (a DataFrame) and fold it in."""
+        self._add_columns(chunk)
+        self.rows += len(chunk)
+
+        def scan(column):
+            series = chunk[column]
+            present = series.notna()
+            hashes = hash_values(series[present])
+            return column, len(series) - int(present.sum()), hashes
+
+        with ThreadPoolExecutor(workers) as pool:
+            for column, nulls, hashes in pool.map(scan, chunk.columns):
+                self.nulls[column] += nulls
+                self.sketches[column].update_hashes(hashes)
+        for column in self.columns:
+            if column not in chunk:
+                self.nulls[column] += len(chunk)
+        if self.numeric:
+            part = RunningStats.from_array(self._numeric_block(chunk))
+            if self.stats is not None:
+                part = _reindexed(self.stats, self.numeric).merge(part)
+            self.stats = part
+        return self
+
+    def merge(self, other):
+        """A new profile covering the rows of both."""
+        result = TableProfile(self.precision)
+        sources = (self, other)
+        for source in sources:
+            for column in source.columns:
+                if column not in result.dtypes:
+                    result.columns.append(column)
+                    result.dtypes[column] = source.dtypes[column]
+                    result.sketches[column] = HyperLogLog(self.precision)
+                    if column in source.numeric:
+                        result.numeric.append(column)
+                else:
+                    result.dtypes[column] = _common_dtype(result.dtypes[column],
+                                                          source.dtypes[column])
+                result.sketches[column] = result.sketches[column].merge(source.sketches[column])
+        for column in result.columns:
+            # A column a profile never saw was null in all of its rows
+            result.nulls[column] = sum(source.nulls.get(column, source.rows) for source in sources)
+        result.rows = self.rows + other.rows
+        parts = [_reindexed(source.stats, result.numeric)
+                 for source in (self, other) if source.stats is not None]
+        result.stats = reduce(RunningStats.merge, parts) if parts else None
+        return result
+
+    def report(self):
+        """One row per column: dtype, nulls, distinct estimate and moments."""
+        table = pd.DataFrame(index=pd.Index(self.columns), columns=list(REPORT_COLUMNS))
+        table['dtype'] = [self.dtypes[c] for c in self.columns]
+        table['nulls'] = [self.nulls[c] for c in self.columns]
+        table['count'] = self.rows - table['nulls']
+        table['null_pct'] = 100 * table['nulls'] / max(self.rows, 1)
+        table['distinct'] = [round(self.sketches[c].count()) for c in self.columns]
+        if self.stats is not None:
+            moments = self.stats.result().T
+            for name in ('min', 'max', 'mean', 'std', 'skew'):
+                table.loc[self.numeric, name] = moments[name].to_numpy()
+        for name in ('min', 'max', 'mean', 'std', 'skew', 'null_pct'):
+            table[name] = table[name].astype(np.float64)
+        return table
+
+
+def profile(chunks, workers=1, precision=HLL_PRECISION):
+    """Profile an iterable of DataFrame chunks, e.g. `pd.read_csv(..., chunksize=...)`."""
+    result = TableProfile(precision)
+    for chunk in chunks:
+        result.update(chunk, workers)
+    return result
+
+
+def _profile_file(read, precision, path):
+    return profile([read(path)], precision=precision)
+
+
+def profile_files(paths, read=pd.read_csv, workers=None, precision=HLL_PRECISION):
+    """Profile a table stored as several files, one file per process."""
+    paths = list(paths)
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        parts = pool.map(partial(_profile_file, read, precision), paths)
+        return reduce(TableProfile.merge, parts, TableProfile(precision))
+
+
+if __name__ == '__main__':
+    import time
+
+    rng = np.random.default_rng(0)
+    n = 2 * 10**6
+    df = pd.DataFrame({
+        'Id': np.arange(n),
+        'LotFrontage': np.where(rng.random(n) < 0.18, np.nan, rng.gamma(9, 7, n)),
+        'GarageYrBlt': np.where(rng.random(n) < 0.05, np.nan, rng.integers(1900, 2011, n)),
+        'Neighborhood': rng.choice(['NAmes', 'CollgCr', 'OldTown', 'Edwards', 'Somerst'], n),
+        'SalePrice': rng.lognormal(12, 0.4, n).round(),
+    })
+
+    start = time.perf_counter()
+    chunks = (df.iloc[i:i + 250000] for i in range(0, n, 250000))
+    report = profile(chunks, workers=4).report()
+    elapsed = time.perf_counter() - start
+    print(report)
+    start = time.perf_counter()
+    exact_distinct = df.nunique()
+    exact_nulls = df.isnull().sum()
+    df.describe()
+    df.select_dtypes('number').skew()
+    print('one pass : %.2fs   nunique + isnull + describe + skew : %.2fs'
+          % (elapsed, time.perf_counter() - start))
+    print('distinct count relative error : %.4f   nulls equal : %s'
+          % (np.max(np.abs(report['distinct'] / exact_distinct - 1)),
+             (report['nulls'] == exact_nulls).all()))
+
+    halves = [TableProfile().update(df.iloc[:n // 2]), TableProfile().update(df.iloc[n // 2:])]
+    merged = halves[0].merge(halves[1]).report()
+    print('merged halves equal one pass : %s'
+          % np.allclose(merged[['nulls', 'mean', 'std']].to_numpy(dtype=float),
+                        report[['nulls', 'mean', 'std']].to_numpy(dtype=float), equal_nan=True))
+
+    # 64-bit IDs above 2**53 stay distinct; 1950 and 1950.0 still count once
+    ids = HyperLogLog().update(np.arange(2**60, 2**60 + 10**5)).count()
+    years = HyperLogLog().update(np.r_[np.arange(1900, 2011), np.arange(1900, 2011) * 1.0]).count()
+    print('distinct 64-bit ids : %.0f (exact 100000)   years as int and float : %.0f (exact 111)'
+          % (ids, years))
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""One-pass, mergeable descriptive statistics for numeric columns.
+
+The lesson calls `min`, `mean`, `max`, then `skew()` and `kurt()` in a loop
+over `numcols`, and each call is another full pass over the column. A
+`RunningStats` accumulator keeps, per column, the count, mean, the central
+moment sums M2, M3, M4, min and max. It gets all of them from one pass:
+
+* `update(chunk)` summarizes a chunk with vectorized NumPy and folds it in
+  with Pebay's pairwise update, the chunk-sized form of Welford's method,
+* `merge(other)` combines two accumulators the same way, so chunks can be
+  summarized in threads or processes (accumulators pickle) and merged,
+* `result()` gives count, mean, var, std, skew, kurt, min and max, with
+  `var`, `skew` and `kurt` matching pandas' unbiased estimators.
+
+NaNs are skipped, as pandas does.
+
+    >>> stats = summarize(pd.read_csv('train.csv', chunksize=10**6))
+    >>> stats.result()
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+STATISTICS = ('count', 'mean', 'var', 'std', 'skew', 'kurt', 'min', 'max')
+
+
+def _as_matrix(chunk):
+    # (rows, columns) float64 matrix and column names of a chunk
+    if isinstance(chunk, pd.DataFrame):
+        chunk = chunk.select_dtypes('number')
+        return chunk.to_numpy(dtype=np.float64, na_value=np.nan), list(chunk.columns)
+    if isinstance(chunk, pd.Series):
+        return chunk.to_numpy(dtype=np.float64, na_value=np.nan)[:, None], [chunk.name]
+    values = np.asarray(chunk, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    return values, None
+
+
+class RunningStats:
+    """Count, mean, M2..M4, min and max of every column, mergeable."""
+
+    def __init__(self, columns=None):
+        self.columns = None if columns is None else list(columns)
+        self.count = None
+
+    def _reset(self, k):
+        self.count = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.m3 = np.zeros(k)
+        self.m4 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+
+    @classmethod
+    def from_array(cls, chunk):
+        """Accumulator of a single chunk (DataFrame, Series or array)."""
+        values, columns = _as_matrix(chunk)
+        result = cls(columns)
+        result._reset(values.shape[1])
+        present = ~np.isnan(values)
+        n = present.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(present, values, 0).sum(axis=0) / n
+            d = np.where(present, values - mean, 0)
+        d2 = d * d
+        result.count = n
+        result.mean = np.where(n > 0, mean, 0.0)
+        result.m2 = d2.sum(axis=0)
+        result.m3 = (d2 * d).sum(axis=0)
+        result.m4 = (d2 * d2).sum(axis=0)
+        if values.shape[0]:
+            result.min = np.fmin.reduce(values, axis=0)
+            result.max = np.fmax.reduce(values, axis=0)
+            result.min[n == 0] = np.inf
+            result.max[n == 0] = -np.inf
+        return result
+
+    def update(self, chunk):
+        """Fold a chunk of rows into the accumulator, in place."""
+        self._absorb(RunningStats.from_array(chunk))
+        return self
+
+    def merge(self, other):
+        """A new accumulator covering the data of both."""
+        result = RunningStats(self.columns)
+        if self.count is not None:
+            result._absorb(self)
+        if other.count is not None:
+            result._absorb(other)
+        return result
+
+    def _absorb(self, other):
+        if self.columns is None:
+            self.columns = other.columns
+        elif other.columns is not None and other.columns != self.columns:
+            raise ValueError('accumulators have different columns')
+        if self.count is None:
+            self._reset(other.count.size)
+        if other.count.size != self.count.size:
+            raise ValueError('accumulators have a different number of columns')
+        na, nb = self.count, other.count
+        n = na + nb
+        # Pebay (2008): combine the central moment sums of two parts
+        safe = np.where(n > 0, n, 1)
+        delta = other.mean - self.mean
+        cross = na * nb / safe
+        d_a = delta * nb / safe
+        d_b = delta * na / safe
+        m4 = (self.m4 + other.m4
+              + delta ** 4 * cross * (na * na - na * nb + nb * nb) / (safe * safe)
+              + 6 * (d_a * d_a * self.m2 + d_b * d_b * other.m2)
+              + 4 * delta * (na * other.m3 - nb * self.m3) / safe)
+        m3 = (self.m3 + other.m3
+              + delta ** 3 * cross * (na - nb) / safe
+              + 3 * delta * (na * other.m2 - nb * self.m2) / safe)
+        m2 = self.m2 + other.m2 + delta * delta * cross
+        self.mean = self.mean + d_a
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.count = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+    def var(self, ddof=1):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > ddof, self.m2 / (self.count - ddof), np.nan)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.var(ddof))
+
+    def skew(self, bias=False):
+        """Skewness; unbiased (same as `Series.skew`) unless `bias`."""
+        n = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            g1 = np.sqrt(n) * self.m3 / self.m2 ** 1.5
+            if bias:
+                return np.where(n > 0, g1, np.nan)
+            g1 = g1 * np.sqrt(n * (n - 1)) / (n - 2)
+            # pandas returns 0 for constant columns
+            g1 = np.where(self.m2 > 0, g1, 0.0)
+            return np.where(n > 2, g1, np.nan)
+
+    def kurt(self, bias=False):
+        """Excess kurtosis; unbiased (same as `Series.kurt`) unless `bias`."""
+        n = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            g2 = n * self.m4 / (self.m2 * self.m2) - 3
+            if bias:
+                return np.where(n > 0, g2, np.nan)
+            g2 = (n - 1) / ((n - 2) * (n - 3)) * ((n + 1) * g2 + 6)
+            g2 = np.where(self.m2 > 0, g2, 0.0)
+            return np.where(n > 3, g2, np.nan)
+
+    def result(self):
+        """DataFrame with one row per statistic and one column per input column."""
+        if self.count is None:
+            return pd.DataFrame(index=list(STATISTICS))
+        empty = self.count == 0
+        table = {
+            'count': self.count,
+            'mean': np.where(empty, np.nan, self.mean),
+            'var': self.var(),
+            'std': self.std(),
+            'skew': self.skew(),
+            'kurt': self.kurt(),
+            'min': np.where(empty, np.nan, self.min),
+            'max': np.where(empty, np.nan, self.max),
+        }
+        columns = self.columns if self.columns is not None else range(self.count.size)
+        return pd.DataFrame(table, index=columns).T
+
+
+def summarize(chunks, workers=1):
+    """Summarize an iterable of chunks, e.g. `pd.read_csv(..., chunksize=...)`.
+
+    With `workers > 1` chunks are summarized in a thread pool (NumPy
+    releases the GIL in the reductions) and merged in input order. At most
+    `2 * workers` chunks are read ahead, so memory stays bounded.
+    """
+    total = RunningStats()
+    if workers <= 1:
+        for chunk in chunks:
+            total.update(chunk)
+        return total
+    chunks = iter(chunks)
+    with ThreadPoolExecutor(workers) as pool:
+        while True:
+            batch = list(islice(chunks, 2 * workers))
+            if not batch:
+                return total
+            total = reduce(RunningStats.merge, pool.map(RunningStats.from_array, batch), total)
+
+
+if __name__ == '__main__':
+    import time
+
+    df = pd.DataFrame({'Name': ['Dan', 'Joann', 'Pedro', 'Rosie', 'Ethan', 'Vicky', 'Frederic'],
+                       'Salary': [50000, 54000, 50000, 189000, 55000, 40000, 59000],
+                       'Hours': [41, 40, 36, 30, 35, 39, 40],
+                       'Grade': [50, 50, 46, 95, 50, 5, 57]})
+    print(RunningStats.from_array(df).result())
+    numcols = ['Salary', 'Hours', 'Grade']
+    print(df[numcols].agg(['skew', 'kurt']))
+
+    rng = np.random.default_rng(0)
+    big = pd.DataFrame(rng.gamma(2.0, 3.0, size=(10**7, 4)), columns=list('abcd'))
+    start = time.perf_counter()
+    chunks = (big.iloc[i:i + 10**6] for i in range(0, len(big), 10**6))
+    one_pass = summarize(chunks, workers=4).result()
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    pandas = big.agg(['count', 'mean', 'var', 'std', 'skew', 'kurt', 'min', 'max'])
+    print(one_pass)
+    print('one pass : %.2fs   pandas, one call per statistic : %.2fs   max rel. gap %.1e'
+          % (elapsed, time.perf_counter() - start,
+             float(np.nanmax(np.abs(one_pass - pandas) / np.abs(pandas)))))
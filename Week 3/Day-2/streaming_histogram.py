@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Histogram with fixed edges that grows batch by batch.
+
+The lesson runs `n, bins = np.histogram(salary, bins=25)` and prints every
+bin in a loop; new data means starting over. A `Histogram` fixes its edges
+once (evenly or log-spaced, or taken from a first batch) and keeps an
+int64 count array:
+
+* `update(batch)` adds a batch, so it can follow a log file forever,
+* `merge(other)` adds the counts of a histogram with the same edges,
+* `quantile`, `density` and `pdf` answer from the counts (values inside
+  a bin are taken as evenly spread, as a histogram plot shows them),
+* `report()` is the lesson's bin-by-bin printout as a DataFrame.
+
+Values outside the edges are counted in `underflow` / `overflow` rather
+than dropped silently, and NaNs in `missing`. Like `np.histogram`, every
+bin is half-open except the last, which includes its right edge.
+
+    >>> hist = Histogram.linear(0, 200000, 25)
+    >>> for batch in batches:
+    ...     hist.update(batch)
+    >>> hist.report()
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Histogram:
+    """Counts over fixed bin edges, updatable and mergeable."""
+
+    def __init__(self, edges, log=False):
+        edges = np.asarray(edges, dtype=np.float64)
+        if edges.ndim != 1 or edges.size < 2 or (np.diff(edges) <= 0).any():
+            raise ValueError('edges must be a strictly increasing 1-D array')
+        self.edges = edges
+        self.counts = np.zeros(edges.size - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+        self.missing = 0
+        # How bin indices are computed: 'linear', 'log' or 'search'
+        widths = np.diff(edges)
+        if log and edges[0] > 0:
+            ratios = edges[1:] / edges[:-1]
+            self._kind = 'log' if np.allclose(ratios, ratios[0]) else 'search'
+        else:
+            self._kind = 'linear' if np.allclose(widths, widths[0]) else 'search'
+
+    @classmethod
+    def linear(cls, lo, hi, bins):
+        """`bins` equal-width bins from `lo` to `hi`."""
+        return cls(np.linspace(lo, hi, bins + 1))
+
+    @classmethod
+    def log(cls, lo, hi, bins):
+        """`bins` log-spaced bins from `lo` to `hi` (both positive)."""
+        if lo <= 0:
+            raise ValueError('log-spaced bins need lo > 0')
+        return cls(np.geomspace(lo, hi, bins + 1), log=True)
+
+    @classmethod
+    def from_data(cls, data, bins=25):
+        """Edges chosen like `np.histogram(data, bins)`, filled with `data`."""
+        data = np.asarray(data, dtype=np.float64)
+        edges = np.histogram_bin_edges(data[~np.isnan(data)], bins=bins)
+        return cls(edges).update(data)
+
+    @property
+    def total(self):
+        """Number of values inside the edges."""
+        return int(self.counts.sum())
+
+    def _bin_index(self, x):
+        lo, k = self.edges[0], self.counts.size
+        if self._kind == 'linear':
+            index = np.floor((x - lo) / (self.edges[-1] - lo) * k)
+        elif self._kind == 'log':
+            index = np.floor(np.log(x / lo) / np.log(self.edges[-1] / lo) * k)
+        else:
+            return np.searchsorted(self.edges, x, side='right') - 1
+        index = np.clip(index, 0, k - 1).astype(np.int64)
+        # Fix values that rounding put one bin off
+        index -= x < self.edges[index]
+        index += x >= self.edges[np.minimum(index + 1, k)]
+        return index
+
+    def update(self, batch):
+        """Add a batch of values."""
+        x = np.asarray(batch, dtype=np.float64).ravel()
+        nan = np.isnan(x)
+        self.missing += int(nan.sum())
+        x = x[~nan]
+        below = x < self.edges[0]
+        above = x > self.edges[-1]
+        self.underflow += int(below.sum())
+        self.overflow += int(above.sum())
+        x = x[~(below | above)]
+        index = np.minimum(self._bin_index(x), self.counts.size - 1)
+        self.counts += np.bincount(index, minlength=self.counts.size)
+        return self
+
+    def merge(self, other):
+        """A new histogram with the counts of both."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('can only merge histograms with the same edges')
+        result = Histogram(self.edges)
+        result._kind = self._kind
+        result.counts = self.counts + other.counts
+        result.underflow = self.underflow + other.underflow
+        result.overflow = self.overflow + other.overflow
+        result.missing = self.missing + other.missing
+        return result
+
+    def density(self):
+        """Density of every bin, like `np.histogram(..., density=True)`."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.counts / (self.total * np.diff(self.edges))
+
+    def pdf(self, x):
+        """Density at `x` (0 outside the edges)."""
+        x = np.asarray(x, dtype=np.float64)
+        inside = (x >= self.edges[0]) & (x <= self.edges[-1])
+        index = np.clip(np.searchsorted(self.edges, x, side='right') - 1,
+                        0, self.counts.size - 1)
+        return np.where(inside, self.density()[index], 0.0)[()]
+
+    def quantile(self, q):
+        """Value at quantile(s) `q` of the values inside the edges.
+
+        Exact up to the position within one bin: the error is at most one
+        bin width.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if ((q < 0) | (q > 1)).any():
+            raise ValueError('quantiles must be in [0, 1]')
+        if self.total == 0:
+            return np.full(q.shape, np.nan)[()]
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)]) / self.total
+        # Runs of empty bins make flat stretches; drop the edges inside a
+        # run, keeping both edges of every non-empty bin
+        filled = np.concatenate([[False], self.counts > 0, [False]])
+        keep = filled[:-1] | filled[1:]
+        return np.interp(q, cumulative[keep], self.edges[keep])[()]
+
+    def percentile(self, p):
+        return self.quantile(np.asarray(p, dtype=np.float64) / 100)
+
+    def report(self):
+        """One row per bin: borders, frequency, density and cumulative share."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cumulative = np.cumsum(self.counts) / self.total
+        return pd.DataFrame({'lower': self.edges[:-1],
+                             'upper': self.edges[1:],
+                             'frequency': self.counts,
+                             'density': self.density(),
+                             'cumulative': cumulative})
+
+
+if __name__ == '__main__':
+    import time
+
+    salary = np.array([50000, 54000, 50000, 189000, 55000, 40000, 59000])
+    hist = Histogram.from_data(salary, bins=25)
+    n, bins = np.histogram(salary, bins=25)
+    print('same counts as np.histogram : ', np.array_equal(hist.counts, n))
+    print(hist.report().head(8))
+
+    # Response times in a log, in batches, on log-spaced bins
+    rng = np.random.default_rng(0)
+    parts = [Histogram.log(1e-3, 1e3, 120) for _ in range(2)]
+    start = time.perf_counter()
+    for i in range(100):
+        parts[i % 2].update(rng.lognormal(-2, 1.2, 10**6))
+    hist = parts[0].merge(parts[1])
+    elapsed = time.perf_counter() - start
+    print('1e8 values in 100 batches : %.2fs   under/overflow %d/%d'
+          % (elapsed, hist.underflow, hist.overflow))
+    p = hist.percentile([50, 95, 99])
+    exact = np.exp(-2 + 1.2 * np.array([0, 1.6448536, 2.3263479]))
+    print('p50/p95/p99 : %s   exact %s' % (p, exact))